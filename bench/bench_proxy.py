@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+代理插件性能测试 - 使用本地模拟源站离线测量ResponseModifierAddon的单请求开销
+
+用法:
+    python bench/bench_proxy.py                      # 运行全部场景
+    python bench/bench_proxy.py --scenario rules1k   # 只运行一个场景
+    python bench/bench_proxy.py --json result.json   # 同时保存结果，便于对比
+
+每个场景在独立子进程中运行(独立的设置目录和内存统计)，
+通过start_proxy_async启动真实代理，并发客户端经代理访问本地HTTP源站。
+"""
+
+import argparse, asyncio, json, os, subprocess, sys, tempfile, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = {
+    'none': "无规则",
+    'rules1k': "1000条URL替换规则",
+    'hooks': "自定义钩子(过滤 + 无过滤)",
+}
+
+SMALL_JSON = json.dumps({'code': 0, 'data': [{'id': i, 'spelling': 'word'} for i in range(5)]}).encode()
+LARGE_IMAGE = os.urandom(1024 * 1024)
+SMALL_ASSET = b"/* asset */" + b"x" * 2048
+
+class OriginHandler(BaseHTTPRequestHandler):
+    """模拟源站 - 按路径返回小JSON、大图片和大量小CSS/JS"""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        if self.path.startswith('/api/'):
+            body, content_type = SMALL_JSON, "application/json"
+        elif self.path.startswith('/img/'):
+            body, content_type = LARGE_IMAGE, "image/png"
+        elif self.path.endswith('.css'):
+            body, content_type = SMALL_ASSET, "text/css"
+        else:
+            body, content_type = SMALL_ASSET, "application/javascript"
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "max-age=3600")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_origin():
+    """启动模拟源站，返回其基础URL"""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), OriginHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="Bench-Origin", daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+def make_settings(scenario, origin):
+    """生成场景对应的设置(与SettingsStore.load的结构相同)"""
+    settings = {'username': 'bench', 'password': 'bench', 'url_replacements': {}}
+    if scenario == 'rules1k':
+        settings['url_replacements'] = {
+            f"{origin}/static/r-{i}.css": f"{origin}/replacement/{i}.css" for i in range(1000)
+        }
+    elif scenario == 'hooks':
+        settings['custom_response_code'] = '''import json
+
+@hook(url=r"/api/", content_type="json")
+def rewrite_api(flow):
+    data = flow.response.json()
+    data["bench"] = True
+    flow.response.text = json.dumps(data)
+
+def custom_response(flow):
+    flow.response.headers["X-Bench"] = "1"
+'''
+    return settings
+
+def make_workload(scenario, origin, total):
+    """生成请求URL列表: 大量小CSS/JS、小JSON和少量大图片"""
+    urls = []
+    for i in range(total):
+        kind = i % 20
+        if kind == 0:
+            urls.append(f"{origin}/img/large-{i % 4}.png")
+        elif kind < 6:
+            urls.append(f"{origin}/api/small-{i % 50}.json")
+        elif scenario == 'rules1k' and kind < 10:
+            urls.append(f"{origin}/static/r-{i % 1000}.css")
+        elif kind % 2:
+            urls.append(f"{origin}/static/a-{i % 200}.css")
+        else:
+            urls.append(f"{origin}/static/a-{i % 200}.js")
+    return urls
+
+def get_rss_mb():
+    """获取当前进程常驻内存(MB)，无法获取时返回None"""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 1024 / 1024
+    except ImportError:
+        pass
+    try:
+        import resource
+        # Linux下单位为KB，作为峰值RSS的近似
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    except ImportError:
+        return None
+
+def percentile(sorted_values, p):
+    index = min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+async def drive(port, urls, concurrency):
+    """并发客户端经代理请求全部URL，返回每个请求的耗时和失败数"""
+    import httpx
+    queue = asyncio.Queue()
+    for url in urls:
+        queue.put_nowait(url)
+    latencies, errors = [], 0
+
+    async def worker(client):
+        nonlocal errors
+        while not queue.empty():
+            url = queue.get_nowait()
+            start = time.perf_counter()
+            try:
+                response = await client.get(url)
+                await response.aread()
+                if response.status_code != 200:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(proxy=f"http://127.0.0.1:{port}", limits=limits, timeout=30) as client:
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+    return latencies, errors
+
+def run_scenario(scenario, requests_count, concurrency, warmup):
+    """在当前进程中运行单个场景并返回结果字典"""
+    # 使用临时设置目录，避免影响真实的设置和缓存
+    os.environ['APPDATA'] = tempfile.mkdtemp(prefix="greenwood-bench-")
+    sys.path.insert(0, project_root)
+
+    origin = start_origin()
+    from src.proxy.settings_store import get_settings_store
+    settings = make_settings(scenario, origin)
+    rules = settings.pop('url_replacements', {})
+    get_settings_store().save(settings, rules=rules)
+
+    # 日志只写文件，避免控制台输出与结果行交错
+    from src.proxy.log_service import configure_logging
+    configure_logging(console=False)
+    from src.proxy.mitmproxy_service import run_in_thread, wait_for_proxy_ready
+    threading.Thread(target=run_in_thread, name="Mitmproxy-Worker", daemon=True).start()
+    port = wait_for_proxy_ready()
+    rss_before = get_rss_mb()
+
+    # 预热: 建立连接并填充替换资源缓存
+    asyncio.run(drive(port, make_workload(scenario, origin, warmup), concurrency))
+
+    urls = make_workload(scenario, origin, requests_count)
+    start = time.perf_counter()
+    latencies, errors = asyncio.run(drive(port, urls, concurrency))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    rss_after = get_rss_mb()
+    return {
+        'scenario': scenario,
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'rss_mb': round(rss_after, 1) if rss_after else None,
+        'rss_growth_mb': round(rss_after - rss_before, 1) if rss_after and rss_before else None,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="绿杉树代理插件性能测试")
+    parser.add_argument('--scenario', choices=list(SCENARIOS), action='append',
+                        help="要运行的场景，可重复指定，默认全部")
+    parser.add_argument('--requests', type=int, default=2000, help="每个场景的请求数")
+    parser.add_argument('--concurrency', type=int, default=16, help="并发客户端数")
+    parser.add_argument('--warmup', type=int, default=200, help="预热请求数")
+    parser.add_argument('--json', help="将结果保存为JSON文件")
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if sys.platform == 'win32':
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+
+    if args.child:
+        result = run_scenario(args.scenario[0], args.requests, args.concurrency, args.warmup)
+        print(json.dumps(result, ensure_ascii=False))
+        return
+
+    results = []
+    for scenario in args.scenario or list(SCENARIOS):
+        print(f"运行场景: {scenario} ({SCENARIOS[scenario]}) ...", flush=True)
+        proc = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--child', '--scenario', scenario,
+             '--requests', str(args.requests), '--concurrency', str(args.concurrency),
+             '--warmup', str(args.warmup)],
+            capture_output=True, text=True, encoding='utf-8',
+        )
+        lines = [line for line in proc.stdout.splitlines() if line.startswith('{')]
+        if proc.returncode != 0 or not lines:
+            print(f"场景 {scenario} 运行失败:\n{proc.stderr}")
+            continue
+        results.append(json.loads(lines[-1]))
+
+    header = f"{'场景':<10}{'请求数':>8}{'失败':>6}{'req/s':>10}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}{'RSS(MB)':>10}"
+    print(header)
+    for r in results:
+        print(f"{r['scenario']:<10}{r['requests']:>8}{r['errors']:>6}{r['rps']:>10}"
+              f"{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}{str(r['rss_mb']):>10}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -10,7 +10,12 @@ a = Analysis(
         'src.gui.settings_dialog',
         'src.gui.browser_window',
         'src.proxy.mitmproxy_service',
+        'src.proxy.proxy_control',
+        'src.gui.metrics_panel',
+        'src.gui.rule_editor',
+        'src.gui.url_interceptor',
         'src.proxy.addons',
+        'src.proxy.theme_pack',
         'config.settings',
     ],
     hookspath=[],
@@ -4,18 +4,94 @@
 
 import sys
 import os
+import time
+import base64
 import ctypes
-from PySide6.QtWidgets import QApplication
+import hashlib
+import subprocess
+from PySide6.QtWidgets import QApplication, QMessageBox
 from PySide6.QtNetwork import QNetworkProxy
 
-def install_certificate():
-    """安装mitmproxy证书"""
-    cert_path = os.path.expanduser("~/.mitmproxy/mitmproxy-ca-cert.cer")
+from src.proxy.paths import get_app_data_dir
+from .startup_timer import startup_timer
+
+def wait_for_file(path, timeout=30.0):
+    """以指数退避等待文件出现，超时返回False"""
+    deadline = time.monotonic() + timeout
+    delay = 0.05
+    while not os.path.exists(path):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, 1.0)
+    return True
+
+def get_cert_thumbprint(cert_path):
+    """计算证书的SHA1指纹(与certutil显示的一致)"""
+    with open(cert_path, 'rb') as f:
+        data = f.read()
+    if b'-----BEGIN CERTIFICATE-----' in data:
+        pem_body = data.split(b'-----BEGIN CERTIFICATE-----')[1].split(b'-----END CERTIFICATE-----')[0]
+        data = base64.b64decode(pem_body)
+    return hashlib.sha1(data).hexdigest().upper()
+
+def is_certificate_trusted(thumbprint):
+    """
+    检查证书是否已在受信任根证书中
+    先查本地缓存的指纹，未命中时才调用certutil查询，查询到后写入缓存
+    """
+    cache_path = os.path.join(get_app_data_dir(), "trusted_ca.txt")
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            if f.read().strip() == thumbprint:
+                return True
+    except OSError:
+        pass
     
-    # 确保证书文件存在
-    while not os.path.exists(cert_path):
+    result = subprocess.run(
+        ['certutil', '-store', 'ROOT', thumbprint],
+        capture_output=True,
+        creationflags=getattr(subprocess, 'CREATE_NO_WINDOW', 0),
+    )
+    if result.returncode != 0:
+        return False
+    try:
+        with open(cache_path, 'w', encoding='utf-8') as f:
+            f.write(thumbprint)
+    except OSError:
+        pass  # 缓存写入失败不影响结果，下次启动再查询certutil
+    return True
+
+def get_cert_path():
+    """mitmproxy CA证书路径"""
+    return os.path.expanduser("~/.mitmproxy/mitmproxy-ca-cert.cer")
+
+def ensure_certificate():
+    """确保mitmproxy证书已受信任，已信任时跳过安装"""
+    cert_path = get_cert_path()
+    
+    # 确保证书文件存在(由代理启动时生成)
+    if not wait_for_file(cert_path):
         print(f"证书文件未找到: {cert_path}")
-        # 这里可以添加等待逻辑或错误处理
+        return False
+    
+    try:
+        if is_certificate_trusted(get_cert_thumbprint(cert_path)):
+            print("证书已受信任，跳过安装")
+            return True
+    except Exception as e:
+        print(f"检查证书状态失败: {e}")
+    
+    if install_certificate():
+        print("证书安装成功")
+        return True
+    print("证书安装失败")
+    return False
+
+def install_certificate():
+    """安装mitmproxy证书"""
+    cert_path = get_cert_path()
     
     # 构建certutil命令
     cmd_command = f'certutil -addstore -f ROOT "{cert_path}"'
@@ -40,33 +116,30 @@ def create_application():
     app.setApplicationName("绿杉树")
     app.setApplicationVersion("1.0.0")
     app.setOrganizationName("绿杉树开发组")
+    startup_timer.mark("创建QApplication")
     
     # 始终设置代理连接（无论模式如何）
     proxy = QNetworkProxy()
     proxy.setType(QNetworkProxy.ProxyType.HttpProxy)
     proxy.setHostName("127.0.0.1")
-    # 从文件读取端口号
-    def get_settings_path():
-        """获取设置文件路径"""
-        appdata_path = os.getenv('APPDATA')
-        if not appdata_path:
-            # 如果无法获取APPDATA，则使用当前目录
-            appdata_path = os.path.dirname(os.path.abspath(__file__))
-        settings_dir = os.path.join(appdata_path, "绿杉树")
-        os.makedirs(settings_dir, exist_ok=True)
-        return os.path.join(settings_dir, "port.txt")
-    settings_path = get_settings_path()
-    with open(settings_path, 'r', encoding='utf-8') as f:
-        port = int(f.read().strip())
+    # 等待代理服务完成端口绑定，使用其报告的实际端口
+    from src.proxy.proxy_control import wait_for_proxy_ready
+    try:
+        port = wait_for_proxy_ready()
+    except Exception as e:
+        # 端口绑定失败或代理进程启动超时，提示原因后退出，不再打开窗口
+        print(f"代理服务启动失败: {e}")
+        QMessageBox.critical(None, "错误", f"代理服务启动失败，程序将退出。\n\n{e}")
+        sys.exit(1)
     
     proxy.setPort(port)
     QNetworkProxy.setApplicationProxy(proxy)
     print("应用程序已设置为始终连接代理")
     
-    # 安装证书
-    if install_certificate():
-        print("证书安装成功")
-    else:
-        print("证书安装失败")
+    startup_timer.mark("等待代理就绪")
+    
+    # 安装证书(已受信任时跳过)
+    ensure_certificate()
+    startup_timer.mark("证书检查")
     
     return app
\ No newline at end of file
@@ -5,10 +5,17 @@
 from PySide6.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, 
                              QHBoxLayout, QLabel, QCheckBox, QFrame, QPushButton)
 from PySide6.QtWebEngineWidgets import QWebEngineView
+from PySide6.QtWebEngineCore import QWebEngineProfile, QWebEnginePage
 from PySide6.QtNetwork import QNetworkProxy
 from PySide6.QtCore import Qt, QUrl, QTimer
 import os
-import json
+
+from src.proxy.paths import get_app_data_dir
+from src.proxy.settings_store import get_settings_store
+from .url_interceptor import install_interceptor
+
+# 浏览器HTTP磁盘缓存默认上限(MB)，可在设置中用http_cache_size_mb覆盖
+DEFAULT_HTTP_CACHE_SIZE_MB = 256
 
 class ModernBrowser(QMainWindow):
     """现代化浏览器窗口类"""
@@ -74,6 +81,9 @@ class ModernBrowser(QMainWindow):
         self.mode_label.setStyleSheet("color: #444; font-size: 13px; margin-right: 5px;")
         title_layout.addWidget(self.mode_label)
 
+        # 统计按钮
+        self.create_metrics_button(title_layout)
+
         # 设置按钮
         self.create_settings_button(title_layout)
 
@@ -83,6 +93,21 @@ class ModernBrowser(QMainWindow):
         # 关闭按钮
         self.create_close_button(title_layout)
     
+    def create_metrics_button(self, parent_layout):
+        """创建性能统计按钮"""
+        self.metrics_btn = QPushButton("📊")
+        self.metrics_btn.setFixedSize(35, 35)
+        self.metrics_btn.setCursor(Qt.CursorShape.PointingHandCursor)
+        self.metrics_btn.setToolTip("代理性能统计")
+        self.metrics_btn.setStyleSheet("""
+            QPushButton { 
+                background: transparent; color: #555; 
+                font-size: 16px; border: none; 
+            }
+            QPushButton:hover { background-color: #D3D3D3; border-radius: 4px; }
+        """)
+        parent_layout.addWidget(self.metrics_btn)
+    
     def create_settings_button(self, parent_layout):
         """创建设置按钮"""
         self.settings_btn = QPushButton("⚙")
@@ -137,9 +162,52 @@ class ModernBrowser(QMainWindow):
         """)
         parent_layout.addWidget(self.close_btn)
     
+    def create_profile(self):
+        """创建持久化的浏览器配置(磁盘缓存、Cookie)，重复加载的资源由Chromium缓存直接提供"""
+        self.browser_data_dir = get_app_data_dir("browser")
+        self.profile = QWebEngineProfile("greenwood", self)
+        self.profile.setPersistentStoragePath(os.path.join(self.browser_data_dir, "storage"))
+        self.profile.setCachePath(os.path.join(self.browser_data_dir, "cache"))
+        self.profile.setHttpCacheType(QWebEngineProfile.HttpCacheType.DiskHttpCache)
+        self.profile.setHttpCacheMaximumSize(self.get_http_cache_size_mb() * 1024 * 1024)
+        self.profile.setPersistentCookiesPolicy(QWebEngineProfile.PersistentCookiesPolicy.ForcePersistentCookies)
+        # 跟踪请求和已缓存的替换资源在浏览器内部处理，不经过代理
+        self.interceptor = install_interceptor(self.profile)
+    
+    def get_http_cache_size_mb(self):
+        """读取浏览器磁盘缓存上限设置"""
+        try:
+            return int(get_settings_store().get('http_cache_size_mb', DEFAULT_HTTP_CACHE_SIZE_MB))
+        except Exception:
+            return DEFAULT_HTTP_CACHE_SIZE_MB
+    
+    def get_cache_stats(self):
+        """统计浏览器磁盘缓存的文件数和占用空间"""
+        files = 0
+        size = 0
+        for root, _, names in os.walk(self.profile.cachePath()):
+            for name in names:
+                try:
+                    size += os.path.getsize(os.path.join(root, name))
+                    files += 1
+                except OSError:
+                    pass
+        return {
+            'files': files,
+            'size_mb': round(size / 1024 / 1024, 1),
+            'max_mb': self.profile.httpCacheMaximumSize() // 1024 // 1024,
+        }
+    
+    def get_interceptor_stats(self):
+        """浏览器内部拦截的请求数"""
+        return self.interceptor.stats()
+    
     def create_browser(self):
         """创建浏览器组件"""
+        self.create_profile()
         self.browser = QWebEngineView()
+        # 页面以浏览器组件为父对象，保证先于配置对象释放
+        self.browser.setPage(QWebEnginePage(self.profile, self.browser))
         self.browser.load(QUrl("https://www.hssenglish.com/student/user/login"))
         self.browser.setStyleSheet("border-bottom-left-radius: 4px; border-bottom-right-radius: 4px;")
     
@@ -148,6 +216,7 @@ class ModernBrowser(QMainWindow):
         self.toggle.stateChanged.connect(self.handle_proxy_change)
         self.close_btn.clicked.connect(self.close)
         self.settings_btn.clicked.connect(self.open_settings)
+        self.metrics_btn.clicked.connect(self.open_metrics)
     
     def update_shell_style(self, is_proxy):
         """动态更新边框样式"""
@@ -164,20 +233,20 @@ class ModernBrowser(QMainWindow):
         """处理代理模式切换 - 现在只控制响应修改功能"""
         is_checked = (state == Qt.CheckState.Checked.value) or (state == Qt.CheckState.PartiallyChecked.value)
         
-        # 获取代理服务中的插件实例
-        from src.proxy.mitmproxy_service import get_addon_instance
+        # 获取代理服务中的插件实例(独立进程模式下为远程代理)
+        from src.proxy.proxy_control import get_addon_instance
         addon_instance = get_addon_instance()
         
         if is_checked:
             print("启用绿杉树模式 - 响应修改功能激活")
-            if addon_instance:
-                addon_instance.set_enabled(True)
-            self.update_shell_style(is_proxy=True)
         else:
             print("禁用绿杉树模式 - 响应修改功能暂停")
-            if addon_instance:
-                addon_instance.set_enabled(False)
-            self.update_shell_style(is_proxy=False)
+        if addon_instance:
+            try:
+                addon_instance.set_enabled(is_checked)
+            except (TimeoutError, ConnectionError, RuntimeError) as e:
+                print(f"切换绿杉树模式失败: {e}")
+        self.update_shell_style(is_proxy=is_checked)
         
         # 显示切换提示并重新加载页面
         self.browser.setHtml("""
@@ -200,8 +269,40 @@ class ModernBrowser(QMainWindow):
     def open_settings(self):
         """打开设置对话框"""
         from .settings_dialog import SettingsDialog
+        store = get_settings_store()
+        content_version = store.content_version()
         dialog = SettingsDialog(self)
-        dialog.exec()
+        if dialog.exec() == dialog.DialogCode.Accepted:
+            self.reload_proxy_settings(clear_cache=store.content_version() != content_version)
+    
+    def reload_proxy_settings(self, clear_cache=False):
+        """
+        保存设置后通知浏览器拦截器和代理立即重新加载
+        规则、变换或主题包有变化时清空浏览器磁盘缓存，已缓存的资源不会继续使用旧内容
+        """
+        if clear_cache:
+            self.profile.clearHttpCache()
+        self.interceptor.reload()
+        from src.proxy.proxy_control import get_addon_instance
+        addon_instance = get_addon_instance()
+        if addon_instance is None:
+            return
+        try:
+            addon_instance.reload_settings()
+        except (TimeoutError, ConnectionError, RuntimeError) as e:
+            print(f"通知代理重新加载设置失败: {e}")
+    
+    def open_metrics(self):
+        """打开性能统计面板(非模态)"""
+        from .metrics_panel import MetricsPanel
+        if getattr(self, 'metrics_panel', None) is None:
+            self.metrics_panel = MetricsPanel(self)
+            self.metrics_panel.finished.connect(self.on_metrics_closed)
+        self.metrics_panel.show()
+        self.metrics_panel.raise_()
+    
+    def on_metrics_closed(self):
+        self.metrics_panel = None
     
     def check_and_prompt_settings(self):
         """检查设置并提示用户设置账号密码"""
@@ -215,27 +316,13 @@ class ModernBrowser(QMainWindow):
     
     def has_saved_settings(self):
         """检查是否已有保存的设置"""
-        settings_path = self.get_settings_path()
         try:
-            if os.path.exists(settings_path):
-                with open(settings_path, 'r', encoding='utf-8') as f:
-                    settings = json.load(f)
-                    username = settings.get('username', '')
-                    password = settings.get('password', '')
-                    return username.strip() != '' and password.strip() != ''
-        except:
-            pass
-        return False
-    
-    def get_settings_path(self):
-        """获取设置文件路径"""
-        appdata_path = os.getenv('APPDATA')
-        if not appdata_path:
-            # 如果无法获取APPDATA，则使用当前目录
-            appdata_path = os.path.dirname(os.path.abspath(__file__))
-        settings_dir = os.path.join(appdata_path, "绿杉树")
-        os.makedirs(settings_dir, exist_ok=True)
-        return os.path.join(settings_dir, "settings.json")
+            store = get_settings_store()
+            username = store.get('username', '')
+            password = store.get('password', '')
+            return username.strip() != '' and password.strip() != ''
+        except Exception:
+            return False
     
     # 窗口拖动功能
     def mousePressEvent(self, event):
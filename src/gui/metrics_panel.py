@@ -0,0 +1,165 @@
+"""
+性能统计面板模块 - 实时显示代理耗时统计
+"""
+
+import time
+from PySide6.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QLabel,
+                              QTreeWidget, QTreeWidgetItem, QPushButton)
+from PySide6.QtCore import QTimer
+
+from src.proxy.constants import STATS_HOST
+
+# (列标题, 指标, 百分位)
+COLUMNS = [
+    ("TTFB p50", 'ttfb', 'p50'),
+    ("TTFB p95", 'ttfb', 'p95'),
+    ("TTFB p99", 'ttfb', 'p99'),
+    ("总耗时 p50", 'total', 'p50'),
+    ("总耗时 p95", 'total', 'p95'),
+    ("客户端连接 p95", 'client_connect', 'p95'),
+    ("插件 p95", 'hook', 'p95'),
+    ("替换获取 p95", 'fetch', 'p95'),
+    ("大小 p50", 'bytes', 'p50'),
+]
+
+class MetricsPanel(QDialog):
+    """性能统计面板(非模态，每秒刷新)"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("代理性能统计")
+        self.resize(1000, 500)
+        self.cache_stats = None
+        self.cache_stats_time = 0
+        self.setup_ui()
+
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+        self.timer.start(1000)
+        self.refresh()
+
+    def setup_ui(self):
+        """设置UI界面"""
+        layout = QVBoxLayout(self)
+
+        self.summary_label = QLabel()
+        self.summary_label.setStyleSheet("color: #444;")
+        layout.addWidget(self.summary_label)
+
+        self.tree = QTreeWidget()
+        self.tree.setHeaderLabels(["名称", "请求数"] + [c[0] for c in COLUMNS])
+        self.tree.setColumnWidth(0, 320)
+        layout.addWidget(self.tree)
+
+        hint_label = QLabel(f"耗时单位为毫秒，大小单位为字节；JSON数据可在浏览器中访问 http://{STATS_HOST}/ 获取")
+        hint_label.setStyleSheet("color: gray; font-size: 10px;")
+        layout.addWidget(hint_label)
+
+        button_layout = QHBoxLayout()
+        button_layout.addStretch()
+        close_btn = QPushButton("关闭")
+        close_btn.setFixedSize(80, 30)
+        close_btn.clicked.connect(self.close)
+        button_layout.addWidget(close_btn)
+        layout.addLayout(button_layout)
+
+    def get_snapshot(self):
+        """获取代理的统计数据，代理未启动时返回None"""
+        from src.proxy.proxy_control import get_metrics_instance
+        metrics = get_metrics_instance()
+        if metrics is None:
+            return None
+        try:
+            return metrics.snapshot()
+        except (TimeoutError, ConnectionError, RuntimeError):
+            return None  # 代理进程未响应或已退出
+
+    def get_cache_stats(self):
+        """获取浏览器磁盘缓存统计(遍历目录较慢，每10秒更新一次)"""
+        parent = self.parent()
+        if parent is None or not hasattr(parent, 'get_cache_stats'):
+            return None
+        now = time.monotonic()
+        if self.cache_stats is None or now - self.cache_stats_time > 10:
+            self.cache_stats = parent.get_cache_stats()
+            self.cache_stats_time = now
+        return self.cache_stats
+
+    def get_interceptor_stats(self):
+        """获取浏览器请求拦截器的统计(这些请求不经过代理，不在下方统计中)"""
+        parent = self.parent()
+        if parent is None or not hasattr(parent, 'get_interceptor_stats'):
+            return None
+        return parent.get_interceptor_stats()
+
+    def group_title(self, item):
+        """分组标题(去掉数量后缀)"""
+        return item.text(0).split(" (")[0]
+
+    def make_item(self, name, aggregate):
+        values = [name, str(aggregate.get('count', 0))]
+        for _, field, p in COLUMNS:
+            value = aggregate.get(field, {}).get(p)
+            values.append("" if value is None else f"{value:g}")
+        return QTreeWidgetItem(values)
+
+    def refresh(self):
+        """刷新统计数据"""
+        data = self.get_snapshot()
+        if data is None:
+            self.summary_label.setText("代理服务未启动或未响应")
+            return
+
+        # 记住展开状态，避免每次刷新折叠
+        expanded = {self.group_title(self.tree.topLevelItem(i)) for i in range(self.tree.topLevelItemCount())
+                    if self.tree.topLevelItem(i).isExpanded()}
+        self.tree.clear()
+
+        summary = f"运行时间: {data['uptime']}s    总请求数: {data['total'].get('count', 0)}"
+        cache_stats = self.get_cache_stats()
+        if cache_stats:
+            summary += (f"    浏览器缓存: {cache_stats['files']} 个文件, "
+                        f"{cache_stats['size_mb']}MB / {cache_stats['max_mb']}MB")
+        interceptor_stats = self.get_interceptor_stats()
+        if interceptor_stats:
+            summary += (f"    浏览器内处理: 屏蔽 {interceptor_stats['blocked']}, "
+                        f"本地返回 {interceptor_stats['redirected']}")
+        cert_stats = data.get('certs')
+        if cert_stats:
+            summary += f"    证书缓存: 命中 {cert_stats['disk_hits']}, 新签发 {cert_stats['generated']}"
+        self.summary_label.setText(summary)
+        self.tree.addTopLevelItem(self.make_item("全部请求", data['total']))
+        for title, group in (("按主机", data['hosts']), ("按替换规则", data['rules'])):
+            parent = QTreeWidgetItem([f"{title} ({len(group)})"])
+            for name, aggregate in sorted(group.items(), key=lambda kv: -kv[1].get('count', 0)):
+                parent.addChild(self.make_item(name, aggregate))
+            self.tree.addTopLevelItem(parent)
+            parent.setExpanded(not expanded or title in expanded)
+
+        hooks = data.get('hooks') or []
+        if hooks:
+            parent = QTreeWidgetItem([f"自定义钩子 ({len(hooks)})"])
+            for stats in hooks:
+                state = "(已跳过)" if stats['disabled'] else ""
+                parent.addChild(QTreeWidgetItem([
+                    f"{stats['stage']}: {stats['name']}{state}  平均 {stats['avg_ms']:g}ms / 最大 {stats['max_ms']:g}ms",
+                    str(stats['calls']),
+                ]))
+            self.tree.addTopLevelItem(parent)
+            parent.setExpanded(True)
+
+        connections = data.get('connections')
+        if connections and connections['hosts']:
+            parent = QTreeWidgetItem([f"上游连接 ({len(connections['hosts'])})"])
+            for host, stats in sorted(connections['hosts'].items(), key=lambda kv: -kv[1]['requests']):
+                ratio = "" if stats['reuse_ratio'] is None else f"{stats['reuse_ratio'] * 100:.0f}%"
+                parent.addChild(QTreeWidgetItem([
+                    f"{host}  连接 {stats['opened']} (HTTP/2 {stats['http2']}, 排队 {stats['waited']}) / 复用率 {ratio}",
+                    str(stats['requests']),
+                ]))
+            self.tree.addTopLevelItem(parent)
+            parent.setExpanded(not expanded or self.group_title(parent) in expanded)
+
+    def closeEvent(self, event):
+        self.timer.stop()
+        super().closeEvent(event)
@@ -0,0 +1,391 @@
+"""
+URL规则编辑器模块 - 基于表格模型的规则编辑，只渲染可见行，校验在线程池中进行
+"""
+
+import itertools, re
+from PySide6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLineEdit, QPushButton,
+                              QTableView, QHeaderView, QAbstractItemView, QCheckBox, QLabel)
+from PySide6.QtCore import (Qt, QAbstractTableModel, QModelIndex, QSortFilterProxyModel,
+                           QObject, QRunnable, QThreadPool, Signal)
+from PySide6.QtGui import QColor
+
+from src.proxy.url_rules import UrlRuleIndex, check_template
+
+# (列标题, 列宽)
+COLUMNS = [
+    ("规则", 330),
+    ("目标URL", 300),
+    ("超时(秒)", 70),
+    ("状态", 0),
+]
+PATTERN_COLUMN, URL_COLUMN, TIMEOUT_COLUMN, STATUS_COLUMN = range(len(COLUMNS))
+
+# 编辑后等待多久再校验(毫秒)，连续输入时只校验一次
+VALIDATE_DELAY_MS = 400
+
+ERROR_COLOR = QColor("#c62828")
+
+def split_target(target):
+    """规则目标拆分为 (目标URL, 超时)"""
+    if isinstance(target, dict):
+        return target.get('url', ''), target.get('timeout')
+    return target, None
+
+def make_target(target, url=None, timeout=...):
+    """修改规则目标的URL或超时，没有其他字段时保存为字符串"""
+    fields = dict(target) if isinstance(target, dict) else {'url': target}
+    if url is not None:
+        fields['url'] = url
+    if timeout is not ...:
+        if timeout is None:
+            fields.pop('timeout', None)
+        else:
+            fields['timeout'] = timeout
+    return fields['url'] if set(fields) == {'url'} else fields
+
+def validate_rules(rules):
+    """
+    校验规则列表 [(规则, 目标)]，返回 {行号: 错误信息}
+    与代理加载设置时的检查一致，额外检查空规则和重复规则
+    """
+    errors = {}
+    index = UrlRuleIndex()
+    seen = {}
+    for row, (pattern, target) in enumerate(rules):
+        if not pattern.strip():
+            errors[row] = "规则不能为空"
+            continue
+        if pattern in seen:
+            errors[row] = f"与第{seen[pattern] + 1}行的规则重复"
+            continue
+        seen[pattern] = row
+        if isinstance(target, dict):
+            if not isinstance(target.get('url'), str):
+                errors[row] = "缺少目标url"
+                continue
+            if not isinstance(target.get('timeout', 0), (int, float)):
+                errors[row] = "timeout必须是数字"
+                continue
+        elif not isinstance(target, str):
+            errors[row] = "目标必须是字符串或字典"
+            continue
+        if not split_target(target)[0].strip():
+            errors[row] = "目标URL不能为空"
+            continue
+        try:
+            index.add(pattern, target)
+        except re.error as e:
+            errors[row] = f"正则表达式错误: {e}"
+            continue
+        try:
+            check_template(pattern, split_target(target)[0])
+        except re.error as e:
+            errors[row] = f"目标URL错误: {e}"
+    return errors
+
+def validate_code(codes):
+    """检查自定义代码 {名称: 源码} 的语法，返回 {名称: 错误信息}"""
+    errors = {}
+    for name, source in codes.items():
+        if not source:
+            continue
+        try:
+            compile(source, '<string>', 'exec')
+        except SyntaxError as e:
+            errors[name] = f"语法错误: {e}"
+    return errors
+
+class RuleTableModel(QAbstractTableModel):
+    """
+    URL规则表格模型 - 每行为 [规则, 目标]，目标与设置中的格式相同(字符串或字典)
+    视图只请求可见行的数据，几万条规则也不会逐行创建控件
+    """
+
+    edited = Signal()  # 用户修改了规则(应用校验结果不会发出)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.rows = []
+        self.errors = {}  # 行号 -> 错误信息，由最近一次校验结果设置
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return COLUMNS[section][0]
+        return super().headerData(section, orientation, role)
+
+    def flags(self, index):
+        flags = super().flags(index)
+        if index.column() != STATUS_COLUMN:
+            flags |= Qt.ItemFlag.ItemIsEditable
+        return flags
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        row, column = index.row(), index.column()
+        if role in (Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.EditRole):
+            pattern, target = self.rows[row]
+            if column == PATTERN_COLUMN:
+                return pattern
+            url, timeout = split_target(target)
+            if column == URL_COLUMN:
+                return url
+            if column == TIMEOUT_COLUMN:
+                return '' if timeout is None else str(timeout)
+            return self.errors.get(row, '')
+        if role == Qt.ItemDataRole.ToolTipRole and row in self.errors:
+            return self.errors[row]
+        if role == Qt.ItemDataRole.ForegroundRole and row in self.errors:
+            return ERROR_COLOR
+        return None
+
+    def setData(self, index, value, role=Qt.ItemDataRole.EditRole):
+        if not index.isValid() or role != Qt.ItemDataRole.EditRole:
+            return False
+        row, column = index.row(), index.column()
+        pattern, target = self.rows[row]
+        value = str(value).strip()
+        if column == PATTERN_COLUMN:
+            pattern = value
+        elif column == URL_COLUMN:
+            target = make_target(target, url=value)
+        elif column == TIMEOUT_COLUMN:
+            try:
+                timeout = float(value) if value else None
+            except ValueError:
+                return False
+            if timeout is not None and timeout.is_integer():
+                timeout = int(timeout)
+            target = make_target(target, timeout=timeout)
+        else:
+            return False
+        self.rows[row] = [pattern, target]
+        self.dataChanged.emit(self.index(row, 0), self.index(row, len(COLUMNS) - 1))
+        self.edited.emit()
+        return True
+
+    def set_rules(self, rules: dict):
+        """整体替换规则(加载设置时调用)"""
+        self.beginResetModel()
+        self.rows = [[pattern, target] for pattern, target in rules.items()]
+        self.errors = {}
+        self.endResetModel()
+
+    def get_rules(self) -> dict:
+        """按表格顺序返回规则字典"""
+        return {pattern: target for pattern, target in self.rows}
+
+    def get_rows(self):
+        """规则行的副本，交给后台线程校验"""
+        return [tuple(row) for row in self.rows]
+
+    def add_rule(self, pattern='', target='') -> int:
+        """在末尾添加一条规则，返回行号"""
+        row = len(self.rows)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self.rows.append([pattern, target])
+        self.endInsertRows()
+        self.edited.emit()
+        return row
+
+    def remove_rules(self, rows):
+        """删除多行规则"""
+        for row in sorted(set(rows), reverse=True):
+            self.beginRemoveRows(QModelIndex(), row, row)
+            del self.rows[row]
+            self.endRemoveRows()
+        if rows:
+            self.edited.emit()
+
+    def set_errors(self, errors: dict):
+        """应用校验结果，只刷新状态有变化的行"""
+        changed = set(errors) ^ set(self.errors) | {row for row in errors if errors[row] != self.errors.get(row)}
+        self.errors = errors
+        for row in changed:
+            if row < len(self.rows):
+                self.dataChanged.emit(self.index(row, 0), self.index(row, len(COLUMNS) - 1))
+
+class RuleFilterModel(QSortFilterProxyModel):
+    """规则搜索过滤 - 按关键字匹配任意列，可只显示有错误的规则"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.errors_only = False
+        self.setFilterKeyColumn(-1)
+        self.setFilterCaseSensitivity(Qt.CaseSensitivity.CaseInsensitive)
+
+    def set_errors_only(self, errors_only: bool):
+        self.errors_only = errors_only
+        self.invalidateFilter()
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        if self.errors_only and source_row not in self.sourceModel().errors:
+            return False
+        return super().filterAcceptsRow(source_row, source_parent)
+
+class ValidationTask(QRunnable):
+    """在线程池中校验规则和自定义代码，结果通过RuleValidator的信号返回主线程"""
+
+    def __init__(self, validator, generation, rows, codes):
+        super().__init__()
+        self.validator = validator
+        self.generation = generation
+        self.rows = rows
+        self.codes = codes
+
+    def run(self):
+        rule_errors = validate_rules(self.rows)
+        code_errors = validate_code(self.codes)
+        try:
+            self.validator.finished.emit(self.generation, rule_errors, code_errors)
+        except RuntimeError:
+            pass  # 对话框已关闭
+
+class RuleValidator(QObject):
+    """
+    后台校验器 - 每次校验分配递增的编号，只有最新一次的结果会通过validated信号发出
+    """
+
+    finished = Signal(int, object, object)  # 工作线程发出: 编号, 规则错误, 代码错误
+    validated = Signal(int, object, object)  # 最新结果: 编号, 规则错误, 代码错误
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.generations = itertools.count(1)
+        self.generation = 0
+        self.finished.connect(self.on_finished)
+
+    def start(self, rows, codes) -> int:
+        """开始校验，返回本次的编号"""
+        self.generation = next(self.generations)
+        QThreadPool.globalInstance().start(ValidationTask(self, self.generation, rows, codes))
+        return self.generation
+
+    def invalidate(self):
+        """数据已修改，正在进行的校验结果作废"""
+        self.generation = next(self.generations)
+
+    def on_finished(self, generation, rule_errors, code_errors):
+        if generation != self.generation:
+            return  # 校验期间又有修改，丢弃过期结果
+        self.validated.emit(generation, rule_errors, code_errors)
+
+class RuleEditor(QWidget):
+    """URL规则编辑控件: 搜索框 + 规则表格 + 添加/删除按钮"""
+
+    changed = Signal()  # 规则被修改
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.model = RuleTableModel(self)
+        self.proxy = RuleFilterModel(self)
+        self.proxy.setSourceModel(self.model)
+        self.setup_ui()
+
+        self.model.edited.connect(self.on_changed)
+
+    def setup_ui(self):
+        """设置UI界面"""
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+
+        toolbar = QHBoxLayout()
+        self.search_edit = QLineEdit()
+        self.search_edit.setPlaceholderText("搜索规则或目标")
+        self.search_edit.setClearButtonEnabled(True)
+        self.search_edit.textChanged.connect(self.proxy.setFilterFixedString)
+        toolbar.addWidget(self.search_edit)
+
+        self.errors_only_check = QCheckBox("只显示错误")
+        self.errors_only_check.toggled.connect(self.proxy.set_errors_only)
+        toolbar.addWidget(self.errors_only_check)
+
+        add_btn = QPushButton("添加")
+        add_btn.clicked.connect(self.add_rule)
+        toolbar.addWidget(add_btn)
+
+        remove_btn = QPushButton("删除")
+        remove_btn.clicked.connect(self.remove_selected)
+        toolbar.addWidget(remove_btn)
+        layout.addLayout(toolbar)
+
+        self.table = QTableView()
+        self.table.setModel(self.proxy)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.table.setEditTriggers(QAbstractItemView.EditTrigger.DoubleClicked
+                                   | QAbstractItemView.EditTrigger.EditKeyPressed
+                                   | QAbstractItemView.EditTrigger.AnyKeyPressed)
+        self.table.setWordWrap(False)
+        # 固定行高和列宽，避免按内容计算尺寸时遍历全部行
+        vertical_header = self.table.verticalHeader()
+        vertical_header.setSectionResizeMode(QHeaderView.ResizeMode.Fixed)
+        vertical_header.setDefaultSectionSize(24)
+        header = self.table.horizontalHeader()
+        for column, (_, width) in enumerate(COLUMNS):
+            if width:
+                self.table.setColumnWidth(column, width)
+        header.setStretchLastSection(True)
+        layout.addWidget(self.table)
+
+        self.status_label = QLabel()
+        self.status_label.setStyleSheet("color: gray; font-size: 10px;")
+        layout.addWidget(self.status_label)
+
+    def set_rules(self, rules: dict):
+        self.model.set_rules(rules)
+        self.update_status()
+
+    def get_rules(self) -> dict:
+        return self.model.get_rules()
+
+    def on_changed(self):
+        self.update_status()
+        self.changed.emit()
+
+    def add_rule(self):
+        """添加空规则并开始编辑"""
+        self.search_edit.clear()
+        self.errors_only_check.setChecked(False)
+        row = self.model.add_rule()
+        index = self.proxy.mapFromSource(self.model.index(row, PATTERN_COLUMN))
+        self.table.scrollTo(index)
+        self.table.setCurrentIndex(index)
+        self.table.edit(index)
+
+    def remove_selected(self):
+        """删除选中的规则"""
+        rows = [self.proxy.mapToSource(index).row() for index in self.table.selectionModel().selectedRows()]
+        self.model.remove_rules(rows)
+
+    def show_row(self, row):
+        """滚动到指定规则行并选中"""
+        index = self.proxy.mapFromSource(self.model.index(row, PATTERN_COLUMN))
+        if not index.isValid():
+            self.search_edit.clear()
+            self.errors_only_check.setChecked(False)
+            index = self.proxy.mapFromSource(self.model.index(row, PATTERN_COLUMN))
+        self.table.scrollTo(index)
+        self.table.selectRow(index.row())
+
+    def set_errors(self, errors: dict):
+        self.model.set_errors(errors)
+        if self.errors_only_check.isChecked():
+            self.proxy.invalidateFilter()
+        self.update_status()
+
+    def update_status(self, validating=False):
+        """显示规则数量和校验状态"""
+        text = f"共 {len(self.model.rows)} 条规则"
+        if validating:
+            text += "，正在检查…"
+        elif self.model.errors:
+            text += f"，{len(self.model.errors)} 条有错误"
+        self.status_label.setText(text)
+        self.status_label.setStyleSheet(
+            f"color: {ERROR_COLOR.name() if self.model.errors and not validating else 'gray'}; font-size: 10px;")
@@ -2,12 +2,16 @@
 设置对话框模块 - 账号密码设置
 """
 
-import os
-import json
 from PySide6.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QLabel, 
                               QLineEdit, QPushButton, QMessageBox, QWidget, QTextEdit,
                               QScrollArea, QFrame)
-from PySide6.QtCore import Qt
+from PySide6.QtCore import Qt, QTimer
+
+from src.gui.rule_editor import RuleEditor, RuleValidator, VALIDATE_DELAY_MS
+from src.proxy.settings_store import get_settings_store
+
+# 自定义代码的名称(与设置项对应)
+CODE_NAMES = {'custom_response_code': "Response函数", 'custom_request_code': "Request函数"}
 
 class SettingsDialog(QDialog):
     """账号密码设置对话框"""
@@ -17,6 +21,15 @@ class SettingsDialog(QDialog):
         self.setWindowTitle("高级设置")
         self.setFixedSize(800, 600)
         self.setWindowFlags(Qt.WindowType.Dialog | Qt.WindowType.WindowCloseButtonHint)
+        self.save_pending = False  # 点击保存后等待校验结果
+
+        # 规则和代码在线程池中校验，修改后延迟一段时间再开始
+        self.validator = RuleValidator(self)
+        self.validator.validated.connect(self.on_validated)
+        self.validate_timer = QTimer(self)
+        self.validate_timer.setSingleShot(True)
+        self.validate_timer.setInterval(VALIDATE_DELAY_MS)
+        self.validate_timer.timeout.connect(self.start_validation)
         
         self.setup_ui()
         self.load_settings()
@@ -52,23 +65,24 @@ class SettingsDialog(QDialog):
         password_layout.addWidget(self.password_edit)
         layout.addLayout(password_layout)
         
-        # URL替换规则输入
-        url_replace_label = QLabel("URL替换规则 (JSON格式):")
+        # URL替换规则
+        url_replace_label = QLabel("URL替换规则:")
         layout.addWidget(url_replace_label)
         
         # 添加示例说明
-        url_example_label = QLabel('''示例格式：
-{
-    "https://example.com/image1.jpg": "https://cdn.example.com/image1.jpg",
-    "https://style.hssenglish.com/v9.0/student/images/theme-lantern/common/bg-1080.png": "https://i1.hdslb.com/bfs/article/4b4d62a69f10b55163fb3ee4da1d2ca4fa7231e8.png"
-}''')
+        url_example_label = QLabel('''示例：
+规则 https://example.com/image1.jpg 目标 https://cdn.example.com/image1.jpg
+规则 https://example.com/img/* 目标 https://cdn.example.com/img/*
+规则 re:https://example.com/js/(\\w+)\\.js 目标 https://cdn.example.com/\\1.js
+以*结尾为前缀匹配，glob:开头为通配符匹配，re:开头为正则匹配；超时为空时使用默认值；双击单元格编辑''')
         url_example_label.setWordWrap(True)
         url_example_label.setStyleSheet("color: gray; font-size: 10px;")
         layout.addWidget(url_example_label)
         
-        self.url_replace_text = QTextEdit()
-        self.url_replace_text.setMinimumHeight(120)
-        layout.addWidget(self.url_replace_text)
+        self.rule_editor = RuleEditor()
+        self.rule_editor.setMinimumHeight(300)
+        self.rule_editor.changed.connect(self.schedule_validation)
+        layout.addWidget(self.rule_editor)
         
         # 自定义Response函数
         response_label = QLabel("自定义Response函数 (Python代码):")
@@ -76,11 +90,15 @@ class SettingsDialog(QDialog):
         
         # 添加示例说明
         response_example_label = QLabel('''示例格式：
-def custom_response(flow):
-    """自定义响应处理函数"""
-    if "example.com" in flow.request.url:
-        flow.response.text = '{"status": "modified"}'
-        flow.response.headers["Content-Type"] = "application/json"
+@hook(host="example.com", url=r"/api/", content_type="json")
+def modify_api(flow):
+    """自定义响应处理函数，只对匹配过滤条件的请求调用"""
+    flow.response.text = '{"status": "modified"}'
+
+async def fetch_extra(flow):  # 也可以是async函数
+    ...
+
+未使用@hook声明的 custom_response(flow) 函数对所有请求生效
 ''')
         response_example_label.setWordWrap(True)
         response_example_label.setStyleSheet("color: gray; font-size: 10px;")
@@ -89,6 +107,8 @@ def custom_response(flow):
         self.response_code_text = QTextEdit()
         self.response_code_text.setMinimumHeight(200)
         layout.addWidget(self.response_code_text)
+        self.response_error_label = self.create_error_label()
+        layout.addWidget(self.response_error_label)
         
         # 自定义Request函数
         request_label = QLabel("自定义Request函数 (Python代码):")
@@ -96,10 +116,12 @@ def custom_response(flow):
         
         # 添加示例说明
         request_example_label = QLabel('''示例格式：
-def custom_request(flow):
-    """自定义请求处理函数"""
-    if "login.example.com" in flow.request.url:
-        flow.request.headers["Authorization"] = "Bearer token123"
+@hook(host="login.example.com")
+def add_token(flow):
+    """自定义请求处理函数，只对匹配过滤条件的请求调用"""
+    flow.request.headers["Authorization"] = "Bearer token123"
+
+未使用@hook声明的 custom_request(flow) 函数对所有请求生效
 ''')
         request_example_label.setWordWrap(True)
         request_example_label.setStyleSheet("color: gray; font-size: 10px;")
@@ -108,6 +130,8 @@ def custom_request(flow):
         self.request_code_text = QTextEdit()
         self.request_code_text.setMinimumHeight(200)
         layout.addWidget(self.request_code_text)
+        self.request_error_label = self.create_error_label()
+        layout.addWidget(self.request_error_label)
         
         # 添加垂直弹簧以填充剩余空间
         layout.addStretch()
@@ -128,107 +152,114 @@ def custom_request(flow):
         cancel_btn.clicked.connect(self.reject)
         button_layout.addWidget(cancel_btn)
         
-        save_btn = QPushButton("保存")
-        save_btn.setFixedSize(80, 30)
-        save_btn.clicked.connect(self.save_settings)
-        button_layout.addWidget(save_btn)
+        self.save_btn = QPushButton("保存")
+        self.save_btn.setFixedSize(80, 30)
+        self.save_btn.clicked.connect(self.save_settings)
+        button_layout.addWidget(self.save_btn)
         
         main_layout.addLayout(button_layout)
         
         self.setLayout(main_layout)
+
+    def create_error_label(self):
+        """代码语法错误提示(无错误时隐藏)"""
+        label = QLabel()
+        label.setWordWrap(True)
+        label.setStyleSheet("color: #c62828; font-size: 10px;")
+        label.hide()
+        return label
         
     def load_settings(self):
         """加载已保存的设置"""
-        settings_path = self.get_settings_path()
         try:
-            if os.path.exists(settings_path):
-                with open(settings_path, 'r', encoding='utf-8') as f:
-                    settings = json.load(f)
-                    self.username_edit.setText(settings.get('username', ''))
-                    self.password_edit.setText(settings.get('password', ''))
-                    
-                    # 加载URL替换规则
-                    url_replacements = settings.get('url_replacements', {})
-                    if url_replacements:
-                        self.url_replace_text.setPlainText(json.dumps(url_replacements, ensure_ascii=False, indent=2))
-                    
-                    # 加载自定义代码
-                    custom_response_code = settings.get('custom_response_code', '')
-                    if custom_response_code:
-                        self.response_code_text.setPlainText(custom_response_code)
-                        
-                    custom_request_code = settings.get('custom_request_code', '')
-                    if custom_request_code:
-                        self.request_code_text.setPlainText(custom_request_code)
+            settings = get_settings_store().load()
+            self.username_edit.setText(settings.get('username', ''))
+            self.password_edit.setText(settings.get('password', ''))
+            
+            # 加载URL替换规则(表格只渲染可见行)
+            self.rule_editor.set_rules(settings.get('url_replacements', {}))
+            
+            # 加载自定义代码
+            custom_response_code = settings.get('custom_response_code', '')
+            if custom_response_code:
+                self.response_code_text.setPlainText(custom_response_code)
+                
+            custom_request_code = settings.get('custom_request_code', '')
+            if custom_request_code:
+                self.request_code_text.setPlainText(custom_request_code)
         except Exception as e:
             print(f"加载设置失败: {e}")
+
+        # 加载完成后再监听代码修改，并在后台检查一次已有的规则
+        self.response_code_text.textChanged.connect(self.schedule_validation)
+        self.request_code_text.textChanged.connect(self.schedule_validation)
+        self.start_validation()
+
+    def get_codes(self):
+        """当前的自定义代码 {设置项: 源码}"""
+        return {
+            'custom_response_code': self.response_code_text.toPlainText().strip(),
+            'custom_request_code': self.request_code_text.toPlainText().strip(),
+        }
+
+    def schedule_validation(self):
+        """内容被修改: 作废进行中的校验，停止输入一段时间后重新校验"""
+        self.validator.invalidate()
+        self.rule_editor.update_status(validating=True)
+        self.validate_timer.start()
+
+    def start_validation(self):
+        """在线程池中校验规则和代码"""
+        self.validate_timer.stop()
+        self.rule_editor.update_status(validating=True)
+        self.validator.start(self.rule_editor.model.get_rows(), self.get_codes())
+
+    def on_validated(self, generation, rule_errors, code_errors):
+        """显示校验结果；点击保存后等待的校验通过时写入设置"""
+        self.rule_editor.set_errors(rule_errors)
+        for name, label in (('custom_response_code', self.response_error_label),
+                            ('custom_request_code', self.request_error_label)):
+            label.setText(code_errors.get(name, ''))
+            label.setVisible(name in code_errors)
+
+        if not self.save_pending:
+            return
+        self.save_pending = False
+        self.save_btn.setEnabled(True)
+        if rule_errors:
+            row = min(rule_errors)
+            self.rule_editor.show_row(row)
+            QMessageBox.critical(self, "错误", f"第{row + 1}行URL替换规则有误: {rule_errors[row]}"
+                                 + (f"\n另有 {len(rule_errors) - 1} 条规则有误" if len(rule_errors) > 1 else ""))
+            return
+        for name, error in code_errors.items():
+            QMessageBox.critical(self, "错误", f"{CODE_NAMES[name]}代码{error}")
+            return
+        self.write_settings()
             
     def save_settings(self):
-        """保存设置"""
+        """保存设置: 先在后台完成校验，通过后再写入"""
         username = self.username_edit.text().strip()
         password = self.password_edit.text().strip()
-        
-        # 验证URL替换规则JSON格式
-        url_replacements_str = self.url_replace_text.toPlainText().strip()
-        url_replacements = {}
-        if url_replacements_str:
-            try:
-                url_replacements = json.loads(url_replacements_str)
-                if not isinstance(url_replacements, dict):
-                    raise ValueError("URL替换规则必须是一个字典")
-            except json.JSONDecodeError as e:
-                QMessageBox.critical(self, "错误", f"URL替换规则JSON格式错误: {e}")
-                return
-            except ValueError as e:
-                QMessageBox.critical(self, "错误", f"{e}")
-                return
-        
-        # 获取自定义代码
-        custom_response_code = self.response_code_text.toPlainText().strip()
-        custom_request_code = self.request_code_text.toPlainText().strip()
-        
-        # 验证Python代码语法
-        if custom_response_code:
-            try:
-                compile(custom_response_code, '<string>', 'exec')
-            except SyntaxError as e:
-                QMessageBox.critical(self, "错误", f"Response函数代码语法错误: {e}")
-                return
-                
-        if custom_request_code:
-            try:
-                compile(custom_request_code, '<string>', 'exec')
-            except SyntaxError as e:
-                QMessageBox.critical(self, "错误", f"Request函数代码语法错误: {e}")
-                return
-        
         if not username or not password:
             QMessageBox.warning(self, "警告", "请填写完整的账号信息！")
             return
-            
-        settings_path = self.get_settings_path()
+
+        self.save_pending = True
+        self.save_btn.setEnabled(False)
+        self.start_validation()
+
+    def write_settings(self):
+        """写入已通过校验的设置"""
         try:
-            settings = {
-                'username': username,
-                'password': password,
-                'url_replacements': url_replacements,
-                'custom_response_code': custom_response_code,
-                'custom_request_code': custom_request_code
-            }
-            with open(settings_path, 'w', encoding='utf-8') as f:
-                json.dump(settings, f, ensure_ascii=False, indent=2)
+            # 只写入有变化的设置项和规则行，其他设置(如url_transforms)保持不变
+            get_settings_store().save({
+                'username': self.username_edit.text().strip(),
+                'password': self.password_edit.text().strip(),
+                **self.get_codes(),
+            }, rules=self.rule_editor.get_rules())
                 
             QMessageBox.information(self, "成功", "设置已保存！")
             self.accept()
         except Exception as e:
             QMessageBox.critical(self, "错误", f"保存设置失败: {e}")
-
-    def get_settings_path(self):
-        """获取设置文件路径"""
-        appdata_path = os.getenv('APPDATA')
-        if not appdata_path:
-            # 如果无法获取APPDATA，则使用当前目录
-            appdata_path = os.path.dirname(os.path.abspath(__file__))
-        settings_dir = os.path.join(appdata_path, "绿杉树")
-        os.makedirs(settings_dir, exist_ok=True)
-        return os.path.join(settings_dir, "settings.json")
\ No newline at end of file
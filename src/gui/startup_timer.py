@@ -0,0 +1,28 @@
+"""
+启动计时模块 - 记录并输出启动各阶段耗时
+需要逐个模块的导入耗时时，可使用 python -X importtime src/main.pyw 运行
+"""
+
+import time
+
+class StartupTimer:
+    """启动阶段计时器"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.last = self.start
+        self.phases = []  # [(阶段名, 耗时秒)]
+
+    def mark(self, name):
+        """记录一个阶段结束，输出该阶段耗时与累计耗时"""
+        now = time.perf_counter()
+        self.phases.append((name, now - self.last))
+        print(f"[启动] {name}: {(now - self.last) * 1000:.0f}ms (累计 {(now - self.start) * 1000:.0f}ms)")
+        self.last = now
+
+    def elapsed(self):
+        """自进程启动计时以来的总耗时(秒)"""
+        return time.perf_counter() - self.start
+
+# 全局计时器，在main.pyw中最先导入
+startup_timer = StartupTimer()
\ No newline at end of file
@@ -0,0 +1,212 @@
+"""
+浏览器请求拦截模块 - 在Chromium内部处理统计/跟踪请求和已缓存的替换资源，不再经过本地代理
+"""
+
+import re, threading
+from concurrent.futures import ThreadPoolExecutor
+from PySide6.QtWebEngineCore import (QWebEngineUrlRequestInterceptor, QWebEngineUrlRequestInfo,
+                                     QWebEngineUrlRequestJob, QWebEngineUrlScheme, QWebEngineUrlSchemeHandler)
+from PySide6.QtCore import QBuffer, QIODevice, QUrl
+
+from src.proxy.asset_cache import AssetCache
+from src.proxy.settings_store import get_settings_store
+from src.proxy.url_rules import UrlRuleIndex
+
+# 本地资源协议，页面中的替换资源重定向到 greenwood-asset:<目标URL>
+ASSET_SCHEME = b"greenwood-asset"
+
+# 默认屏蔽的统计/跟踪主机(含子域名)，可在设置中用blocked_hosts覆盖
+DEFAULT_BLOCKED_HOSTS = (
+    "google-analytics.com",
+    "googletagmanager.com",
+    "doubleclick.net",
+    "hm.baidu.com",
+    "cnzz.com",
+    "umeng.com",
+)
+
+# 浏览器进程中替换资源的内存缓存上限，代理进程中另有一份
+MEMORY_CACHE_BYTES = 32 * 1024 * 1024
+
+# 只重定向这些类型的资源: 重定向后页面看到的是本地协议URL，
+# CSS/JS中的相对路径会失效，因此样式表、脚本和页面仍由代理替换
+ResourceType = QWebEngineUrlRequestInfo.ResourceType
+REDIRECT_TYPES = {ResourceType.ResourceTypeImage, ResourceType.ResourceTypeFavicon,
+                  ResourceType.ResourceTypeFontResource, ResourceType.ResourceTypeMedia}
+NAVIGATION_TYPES = {ResourceType.ResourceTypeMainFrame, ResourceType.ResourceTypeSubFrame}
+
+def register_asset_scheme():
+    """注册本地资源协议(必须在创建QApplication之前调用)"""
+    scheme = QWebEngineUrlScheme(ASSET_SCHEME)
+    scheme.setSyntax(QWebEngineUrlScheme.Syntax.Path)
+    # Secure: https页面加载时不算混合内容；CorsEnabled: 字体等跨域加载的资源可用
+    scheme.setFlags(QWebEngineUrlScheme.Flag.SecureScheme | QWebEngineUrlScheme.Flag.CorsEnabled)
+    QWebEngineUrlScheme.registerScheme(scheme)
+
+def make_asset_url(target_url) -> QUrl:
+    url = QUrl()
+    url.setScheme(ASSET_SCHEME.decode())
+    url.setPath(target_url)
+    return url
+
+class RuleSet:
+    """
+    浏览器端使用的规则集合 - 由设置一次性构建，通过替换引用原子地切换
+    URL规则使用与代理相同的UrlRuleIndex
+    """
+
+    __slots__ = ('url_rules', 'transforms', 'blocked_hosts', 'redirect_enabled')
+
+    def __init__(self, settings=None):
+        settings = settings or {}
+        self.url_rules = UrlRuleIndex(settings.get('url_replacements', {}))
+        # 命中响应变换的URL需要经过代理处理，这里只需知道是否命中
+        self.transforms = UrlRuleIndex(dict.fromkeys(settings.get('url_transforms', {}), True))
+        self.blocked_hosts = frozenset(settings.get('blocked_hosts', DEFAULT_BLOCKED_HOSTS))
+        # 自定义钩子可能改写请求或替换后的响应，配置了自定义代码时替换资源全部交给代理
+        self.redirect_enabled = not (settings.get('custom_request_code') or settings.get('custom_response_code'))
+
+    def is_blocked(self, host):
+        """主机或其上级域名在屏蔽列表中"""
+        if not self.blocked_hosts or not host:
+            return False
+        while True:
+            if host in self.blocked_hosts:
+                return True
+            dot = host.find('.')
+            if dot < 0:
+                return False
+            host = host[dot + 1:]
+
+    def get_redirect_target(self, url):
+        """URL命中替换规则(且不需要代理处理)时返回目标URL，否则返回None"""
+        if not self.redirect_enabled:
+            return None
+        match = self.url_rules.match(url)
+        if match is None or self.transforms.match(url) is not None:
+            return None
+        target = match.value.get('url', '') if isinstance(match.value, dict) else match.value
+        try:
+            return match.resolve(target) or None
+        except (re.error, IndexError):
+            return None  # 目标模板无效，交给代理处理(代理记录错误后请求照常发往上游)
+
+class BrowserRequestInterceptor(QWebEngineUrlRequestInterceptor):
+    """
+    请求拦截器 - 安装在浏览器配置上，每个请求发出前在界面线程中调用
+      - 屏蔽统计/跟踪主机的子资源请求
+      - 替换目标已在缓存中且未过期的图片、字体、音视频，直接由本地协议返回
+    其余请求照常经过代理；缓存未命中时在后台从磁盘读取，下次请求即可命中
+    """
+
+    def __init__(self, cache: AssetCache, parent=None):
+        super().__init__(parent)
+        self.cache = cache
+        self.rules = RuleSet()  # 规则加载完成前不做任何处理
+        self.enabled = True
+        self.version = None  # 当前规则对应的设置修改计数
+        self.loader = ThreadPoolExecutor(max_workers=1, thread_name_prefix="Asset-Loader")
+        self.pending = set()  # 正在从磁盘读取的目标URL
+        self.pending_lock = threading.Lock()
+        self.blocked = 0
+        self.redirected = 0
+
+    def reload(self):
+        """在后台线程中重新读取设置并构建规则，设置未变化时跳过"""
+        threading.Thread(target=self.load_rules, name="Interceptor-Rules", daemon=True).start()
+
+    def load_rules(self):
+        store = get_settings_store()
+        try:
+            version = store.version()
+            if version == self.version:
+                return
+            settings = store.load()
+            rules = RuleSet(settings)
+        except Exception as e:
+            print(f"加载浏览器拦截规则失败: {e}")
+            return
+        self.enabled = bool(settings.get('browser_intercept', True))
+        self.rules = rules
+        self.version = version
+
+    def interceptRequest(self, info: QWebEngineUrlRequestInfo):
+        if not self.enabled:
+            return
+        resource_type = info.resourceType()
+        if resource_type in NAVIGATION_TYPES:
+            return
+        rules = self.rules
+        url = info.requestUrl()
+        if rules.is_blocked(url.host()):
+            self.blocked += 1
+            info.block(True)
+            return
+        if resource_type not in REDIRECT_TYPES or info.requestMethod() != b"GET":
+            return
+        target = rules.get_redirect_target(url.toEncoded().data().decode())
+        if target is None:
+            return
+        entry = self.cache.get(target)
+        if entry is not None and entry.is_fresh():
+            self.redirected += 1
+            info.redirect(make_asset_url(target))
+        else:
+            self.schedule_load(target)
+
+    def schedule_load(self, target):
+        """在后台从磁盘缓存读取目标(每个目标同时只读取一次)"""
+        with self.pending_lock:
+            if target in self.pending:
+                return
+            self.pending.add(target)
+        self.loader.submit(self.load_entry, target)
+
+    def load_entry(self, target):
+        try:
+            self.cache.load_from_disk(target)
+        finally:
+            with self.pending_lock:
+                self.pending.discard(target)
+
+    def preload(self):
+        """后台预加载磁盘缓存，启动后首屏的替换资源即可直接命中"""
+        self.loader.submit(self.cache.preload)
+
+    def stats(self):
+        return {'blocked': self.blocked, 'redirected': self.redirected}
+
+class AssetSchemeHandler(QWebEngineUrlSchemeHandler):
+    """本地资源协议处理器 - 从内存缓存返回替换资源"""
+
+    def __init__(self, cache: AssetCache, parent=None):
+        super().__init__(parent)
+        self.cache = cache
+
+    def requestStarted(self, job: QWebEngineUrlRequestJob):
+        target = job.requestUrl().path(QUrl.ComponentFormattingOption.FullyDecoded)
+        entry = self.cache.get(target)
+        if entry is None:
+            # 缓存条目在重定向后被淘汰，让页面按加载失败处理
+            job.fail(QWebEngineUrlRequestJob.Error.UrlNotFound)
+            return
+        if hasattr(job, 'setAdditionalResponseHeaders'):
+            job.setAdditionalResponseHeaders({b"Access-Control-Allow-Origin": b"*",
+                                              b"Cache-Control": b"no-cache",
+                                              b"ETag": entry.response_etag().encode('latin-1', 'replace')})
+        buffer = QBuffer(job)
+        buffer.setData(entry.content)
+        buffer.open(QIODevice.OpenModeFlag.ReadOnly)
+        content_type = entry.content_type or "application/octet-stream"
+        job.reply(content_type.encode('latin-1', 'replace'), buffer)
+
+def install_interceptor(profile):
+    """在浏览器配置上安装请求拦截器和本地资源协议处理器，返回拦截器"""
+    cache = AssetCache(max_memory_bytes=MEMORY_CACHE_BYTES)
+    interceptor = BrowserRequestInterceptor(cache, profile)
+    handler = AssetSchemeHandler(cache, profile)
+    profile.installUrlSchemeHandler(ASSET_SCHEME, handler)
+    profile.setUrlRequestInterceptor(interceptor)
+    interceptor.reload()
+    interceptor.preload()
+    return interceptor
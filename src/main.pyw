@@ -6,8 +6,8 @@
 
 import sys
 import os
-import threading
 import asyncio
+import multiprocessing
 import ctypes
 import subprocess
 import base64
@@ -93,42 +93,60 @@ exit 0
         print(f"❌ 任务创建失败: {err}")
         return False
 
-if is_admin():
-    if "python" in sys.executable:
-        create_install_task("绿杉树启动-python", f'"cmd.exe" /c "{sys.executable}" "{" ".join(sys.argv)}"')
+def ensure_elevated():
+    """确保以管理员身份运行: 已是管理员时登记计划任务，否则通过计划任务或UAC重新启动本程序并退出"""
+    if is_admin():
+        if "python" in sys.executable:
+            create_install_task("绿杉树启动-python", f'"cmd.exe" /c "{sys.executable}" "{" ".join(sys.argv)}"')
+        else:
+            create_install_task("绿杉树启动", f'"{os.path.join(os.path.dirname(os.path.abspath(sys.executable)), "start.vbs")}"')
     else:
-        create_install_task("绿杉树启动", f'"{os.path.join(os.path.dirname(os.path.abspath(sys.executable)), "start.vbs")}"')
-else:
-    if check_task_exists("绿杉树启动") or ("python" in sys.executable and check_task_exists("绿杉树启动-python")):
-        run_task("绿杉树启动" if not "python" in sys.executable else "绿杉树启动-python")
-        sys.exit(0)
-    else:
-        ctypes.windll.shell32.ShellExecuteW(None, "runas", sys.executable, " ".join(sys.argv), None, 0)
-        sys.exit(0)
+        if check_task_exists("绿杉树启动") or ("python" in sys.executable and check_task_exists("绿杉树启动-python")):
+            run_task("绿杉树启动" if not "python" in sys.executable else "绿杉树启动-python")
+            sys.exit(0)
+        else:
+            ctypes.windll.shell32.ShellExecuteW(None, "runas", sys.executable, " ".join(sys.argv), None, 0)
+            sys.exit(0)
 
 # 添加项目根目录到Python路径
 project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.insert(0, project_root)
 
-from src.gui.browser_window import ModernBrowser
-from src.proxy.mitmproxy_service import run_in_thread
-
 if __name__ == "__main__":
+    # 打包后的代理子进程从这里进入并在此返回，不会执行下面的提权和界面逻辑
+    multiprocessing.freeze_support()
+    ensure_elevated()
+    
+    from src.gui.startup_timer import startup_timer
+    
     # 设置Windows事件循环策略
     if sys.platform == 'win32':
         asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
     
-    # 启动代理服务线程（始终保持连接）
-    proxy_thread = threading.Thread(target=run_in_thread, name="Mitmproxy-Worker", daemon=True)
-    proxy_thread.start()
-    
-    # 等待代理服务启动
-    import time
-    time.sleep(2)  # 给代理服务启动时间
+    # 启动代理服务（默认在独立进程中运行，设置中proxy_process为false时使用线程）
+    from src.proxy.proxy_control import start_proxy
+    start_proxy()
     
-    # 启动GUI应用程序
+    # 代理启动的同时导入界面模块
+    from src.gui.browser_window import ModernBrowser
     from src.gui.application import create_application
+    from src.gui.url_interceptor import register_asset_scheme
+    startup_timer.mark("导入界面模块")
+    
+    # 自定义协议必须在创建QApplication之前注册
+    register_asset_scheme()
+    
+    # 启动GUI应用程序(内部等待代理就绪后再设置代理端口)
     app = create_application()
     window = ModernBrowser()
     window.show()
+    startup_timer.mark("创建窗口")
+    
+    def report_first_paint(ok):
+        """首次页面加载完成时输出启动总耗时"""
+        window.browser.loadFinished.disconnect(report_first_paint)
+        startup_timer.mark("首屏加载")
+        print(f"启动完成，首屏耗时 {startup_timer.elapsed() * 1000:.0f}ms")
+    window.browser.loadFinished.connect(report_first_paint)
+    
     sys.exit(app.exec())
\ No newline at end of file
@@ -2,9 +2,46 @@
 mitmproxy插件模块 - 响应修改器
 """
 
-import json, time, os, requests
+import asyncio, json, re, time
+import httpx
 from mitmproxy import http, ctx
 
+from .asset_cache import AssetCache
+from .constants import FETCH_TIME_KEY, HOOK_TIME_KEY, RULE_KEY, STATS_HOST
+from .fetcher import AssetFetcher
+from .log_service import get_logger
+from .metrics import add_time
+from .settings_service import SettingsSnapshot, SettingsWatcher
+from .settings_store import get_settings_store
+
+# 自动登录时需要改写的登录请求
+LOGIN_URL = "https://www.hssenglish.com/student/user/login"
+
+# 插件自身总会处理的主机(登录、答案改写、统计接口)
+BUILTIN_HOSTS = {"www.hssenglish.com", STATS_HOST}
+
+# 预热替换资源时的最大并发数，留出连接给浏览器的首屏请求
+WARMUP_CONCURRENCY = 6
+# 预热单个资源的默认超时(秒)，规则中指定了timeout时以规则为准
+WARMUP_TIMEOUT = 15.0
+
+logger = get_logger("addons")
+
+def host_pattern(host):
+    """将主机名转换为mitmproxy allow_hosts使用的正则(匹配 host 或 host:port)"""
+    if host.startswith('.'):
+        return rf"^(.+\.)?{re.escape(host[1:])}(:\d+)?$"
+    return rf"^{re.escape(host)}(:\d+)?$"
+
+def parse_replacement(rule):
+    """
+    解析单条URL替换规则的目标
+    规则值可以是目标URL字符串，也可以是 {"url": ..., "timeout": 秒} 形式的字典
+    """
+    if isinstance(rule, dict):
+        return rule.get('url', ''), rule.get('timeout')
+    return rule, None
+
 class ResponseModifierAddon:
     """
     响应修改插件 - 修改特定URL的HTTP响应
@@ -17,103 +54,297 @@ class ResponseModifierAddon:
             "https://www.hssenglish.com/student/studyFlow/next"
         ]
         self.is_enabled = False  # 默认禁用响应修改
-        self.url_replacements = {}  # URL替换规则
-        self.custom_response_func = None  # 自定义响应函数
-        self.custom_request_func = None  # 自定义请求函数
+        self.settings = SettingsSnapshot()  # 当前设置快照(URL规则、自定义钩子、凭据)
+        self.settings_watcher = None  # 设置文件监视器
+        self.credentials_ready = asyncio.Event()  # 已配置账号密码时置位
+        self.loop = None  # 代理事件循环，设置监视线程通过它通知协程
+        self.asset_cache = AssetCache()  # 替换资源缓存(内存LRU + 磁盘)
+        self.fetcher = AssetFetcher(cache=self.asset_cache)  # 替换资源获取器(连接池)
+        self.warmed_targets = set()  # 已预热(或正在预热)的替换目标
+        self.warmup_tasks = set()  # 进行中的预热任务，保留引用防止被回收
     
     def set_enabled(self, enabled: bool):
         """设置响应修改功能是否启用"""
         self.is_enabled = enabled
         if enabled:
-            ctx.log.info("绿杉树模式已启用 - 响应修改功能激活")
+            logger.info("绿杉树模式已启用 - 响应修改功能激活")
         else:
-            ctx.log.info("绿杉树模式已禁用 - 响应修改功能暂停")
+            logger.info("绿杉树模式已禁用 - 响应修改功能暂停")
     
-    def get_settings_path(self):
-        """获取设置文件路径"""
-        appdata_path = os.getenv('APPDATA')
-        if not appdata_path:
-            # 如果无法获取APPDATA，则使用当前目录
-            appdata_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        settings_dir = os.path.join(appdata_path, "绿杉树")
-        os.makedirs(settings_dir, exist_ok=True)
-        return os.path.join(settings_dir, "settings.json")
+    def reload_settings(self):
+        """唤醒设置监视线程立即重新检查设置(可在任意线程调用)，不必等待下一次轮询"""
+        if self.settings_watcher is not None:
+            self.settings_watcher.wake()
     
-    def load_custom_functions(self):
-        """加载自定义函数"""
-        settings_path = self.get_settings_path()
-        try:
-            if os.path.exists(settings_path):
-                with open(settings_path, 'r', encoding='utf-8') as f:
-                    settings = json.load(f)
-                    
-                    # 更新URL替换规则
-                    self.url_replacements = settings.get('url_replacements', {})
-                    
-                    # 获取自定义代码
-                    custom_response_code = settings.get('custom_response_code', '')
-                    custom_request_code = settings.get('custom_request_code', '')
-                    
-                    # 编译并设置自定义响应函数
-                    if custom_response_code:
-                        exec_globals = {'http': http, 'ctx': ctx, 'requests': requests}
-                        exec(custom_response_code, exec_globals)
-                        # 假设用户定义的函数名为 custom_response
-                        if 'custom_response' in exec_globals:
-                            self.custom_response_func = exec_globals['custom_response']
-                    
-                    # 编译并设置自定义请求函数
-                    if custom_request_code:
-                        exec_globals = {'http': http, 'ctx': ctx}
-                        exec(custom_request_code, exec_globals)
-                        # 假设用户定义的函数名为 custom_request
-                        if 'custom_request' in exec_globals:
-                            self.custom_request_func = exec_globals['custom_request']
-                            
-                    return settings.get('username', ''), settings.get('password', '')
-        except Exception as e:
-            ctx.log.error(f"加载自定义函数失败: {e}")
-        # 如果读取失败，返回空字符串
-        return '', ''
+    def apply_settings(self, snapshot: SettingsSnapshot):
+        """
+        切换到新的设置快照(由设置监视线程调用，单次引用赋值即原子切换)
+        旧快照的主题包映射在事件循环中关闭，不会与正在读取资源的请求冲突
+        """
+        previous = self.settings
+        self.settings = snapshot
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.settings_applied)
+            self.loop.call_soon_threadsafe(previous.theme_packs.close)
+        else:
+            self.update_credentials_ready()
+            previous.theme_packs.close()
+        logger.info("设置已更新，共 %d 条URL替换规则", len(snapshot.url_rules))
+    
+    def settings_applied(self):
+        """新设置快照生效后的处理(在事件循环中调用)"""
+        self.update_credentials_ready()
+        self.update_allow_hosts()
+        self.schedule_warmup()
+    
+    def update_credentials_ready(self):
+        """根据当前快照更新凭据就绪事件(在事件循环中调用)"""
+        if self.settings.has_credentials:
+            self.credentials_ready.set()
+        else:
+            self.credentials_ready.clear()
+    
+    def get_intercept_hosts(self):
+        """
+        汇总需要拦截的主机: 内置主机、URL规则、响应变换、主题包和自定义钩子涉及的主机
+        无法确定范围(通配符/正则规则、未声明host的钩子)或设置了intercept_all_hosts时返回None
+        """
+        settings = self.settings
+        if settings.intercept_all_hosts:
+            return None
+        rule_hosts = settings.url_rules.hosts()
+        transform_hosts = settings.url_transforms.hosts()
+        hook_hosts = settings.hooks.hosts()
+        if rule_hosts is None or transform_hosts is None or hook_hosts is None:
+            return None
+        return BUILTIN_HOSTS | rule_hosts | transform_hosts | hook_hosts | settings.theme_packs.hosts()
+    
+    def update_allow_hosts(self):
+        """
+        按需要拦截的主机更新allow_hosts，其余主机的TLS连接直接透传，不解密也不经过插件
+        """
+        hosts = self.get_intercept_hosts()
+        allow_hosts = sorted(host_pattern(h) for h in hosts) if hosts is not None else []
+        if list(ctx.options.allow_hosts) != allow_hosts:
+            ctx.options.update(allow_hosts=allow_hosts)
+            if hosts is None:
+                logger.info("拦截全部主机")
+            else:
+                logger.info("仅拦截 %d 个主机，其余连接直接透传: %s", len(hosts), ', '.join(sorted(hosts)))
     
     def get_login_credentials(self):
-        """从配置文件获取登录凭据和自定义函数"""
-        username, password = self.load_custom_functions()
-        return username, password
+        """从当前设置快照获取登录凭据"""
+        settings = self.settings
+        return settings.username, settings.password
     
-    def response(self, flow: http.HTTPFlow) -> None:
-        # 首先尝试执行自定义响应函数
-        if self.custom_response_func:
-            try:
-                self.custom_response_func(flow)
-            except Exception as e:
-                ctx.log.error(f"执行自定义响应函数时出错: {str(e)}")
+    def get_warmup_targets(self):
+        """
+        收集可预热的替换目标: URL -> 超时
+        前缀/正则规则的目标需要按实际请求展开，无法预先获取，跳过
+        """
+        targets = {}
+        for value in self.settings.url_replacements.values():
+            target, timeout = parse_replacement(value)
+            if not isinstance(target, str) or not target.startswith(('http://', 'https://')):
+                continue
+            if '*' in target or '\\' in target:
+                continue
+            targets[target] = timeout or WARMUP_TIMEOUT
+        return targets
+    
+    def schedule_warmup(self):
+        """在后台预热新增的替换目标(在事件循环中调用)，规则变化时只获取新出现的目标"""
+        targets = self.get_warmup_targets()
+        self.warmed_targets &= targets.keys()
+        pending = {url: timeout for url, timeout in targets.items() if url not in self.warmed_targets}
+        if not pending:
+            return
+        self.warmed_targets |= pending.keys()
+        task = asyncio.create_task(self.warm_up(pending))
+        self.warmup_tasks.add(task)
+        task.add_done_callback(self.warmup_tasks.discard)
+    
+    async def warm_up(self, targets):
+        """并发获取替换目标填充缓存，新鲜的缓存条目不会产生网络请求"""
+        semaphore = asyncio.Semaphore(WARMUP_CONCURRENCY)
+        start = time.perf_counter()
         
-        # 检查是否有URL替换规则需要应用
-        for original_url, redirect_url in self.url_replacements.items():
-            if flow.request.url == original_url:
+        async def warm(url, timeout):
+            async with semaphore:
                 try:
-                    # 获取目标内容
-                    response = requests.get(redirect_url)
-                    if response.status_code == 200:
-                        # 创建新的HTTP响应，直接返回目标内容
-                        flow.response = http.Response.make(
-                            200,
-                            response.content,
-                            {
-                                "Content-Type": response.headers.get("Content-Type", "application/octet-stream"),
-                                "Content-Length": str(len(response.content)),
-                                "Access-Control-Allow-Origin": "*",
-                                "Cache-Control": "public, max-age=3600",
-                                "Location": redirect_url  # 添加重定向头
-                            }
-                        )
-                        ctx.log.info(f"已将 {original_url} 替换为目标内容: {redirect_url}")
-                    else:
-                        ctx.log.error(f"获取目标内容失败，状态码: {response.status_code}, URL: {redirect_url}")
+                    await self.fetcher.fetch_asset(url, timeout=timeout)
+                    return True
                 except Exception as e:
-                    ctx.log.error(f"替换URL时发生错误: {str(e)}, Original: {original_url}, Redirect: {redirect_url}")
-                return  # 如果已经处理了URL替换，就不再继续
+                    # 失败的目标下次规则变化时重试，浏览器请求时也会再次获取
+                    self.warmed_targets.discard(url)
+                    logger.warn("预热替换资源失败: %s, URL: %s", e, url)
+                    return False
+        
+        results = await asyncio.gather(*(warm(url, timeout) for url, timeout in targets.items()))
+        logger.info("已预热 %d/%d 个替换资源，耗时 %.2fs", sum(results), len(results), time.perf_counter() - start)
+    
+    async def running(self):
+        """代理启动后加载设置并开始监视(设置生效后在后台预热替换资源)，同时预加载磁盘缓存"""
+        self.loop = asyncio.get_running_loop()
+        # 打开设置存储(首次运行时导入旧的settings.json)
+        store = await asyncio.to_thread(get_settings_store)
+        self.settings_watcher = SettingsWatcher(store, self.apply_settings)
+        await asyncio.to_thread(self.settings_watcher.check)
+        self.settings_watcher.start()
+        loaded = await asyncio.to_thread(self.asset_cache.preload)
+        logger.info("已从磁盘缓存预加载 %d 个替换资源", loaded)
+    
+    async def done(self):
+        """代理关闭时停止设置监视并释放连接池"""
+        if self.settings_watcher is not None:
+            self.settings_watcher.stop()
+        for task in list(self.warmup_tasks):
+            task.cancel()
+        await self.fetcher.close()
+    
+    async def apply_url_replacement(self, flow: http.HTTPFlow) -> bool:
+        """
+        在请求阶段应用URL替换规则，命中时直接构造响应，不再连接上游服务器
+        返回是否已替换；获取目标失败时返回False，请求照常发往上游
+        """
+        match = self.settings.url_rules.match(flow.request.url)
+        if match is None:
+            return False
+        original_url = flow.request.url
+        redirect_url, timeout = parse_replacement(match.value)
+        flow.metadata[RULE_KEY] = match.pattern
+        try:
+            redirect_url = match.resolve(redirect_url)
+        except (re.error, IndexError) as e:
+            # 正则规则的目标引用了不存在的分组(未知分组名时抛出IndexError)
+            logger.error("展开目标URL失败: %s, Original: %s, Redirect: %s", e, original_url, redirect_url, rule=match.pattern)
+            return False
+        fetch_start = time.perf_counter()
+        try:
+            # 获取目标内容(优先命中缓存，异步不阻塞其他请求)
+            entry = await self.fetcher.fetch_asset(redirect_url, timeout=timeout)
+        except httpx.TimeoutException:
+            logger.error("获取目标内容超时, Original: %s, Redirect: %s", original_url, redirect_url, rule=match.pattern)
+            return False
+        except Exception as e:
+            logger.error("替换URL时发生错误: %s, Original: %s, Redirect: %s", e, original_url, redirect_url, rule=match.pattern)
+            return False
+        finally:
+            add_time(flow, FETCH_TIME_KEY, time.perf_counter() - fetch_start)
+        # 创建新的HTTP响应，直接返回目标内容
+        # 使用no-cache + ETag: 浏览器每次都会重新验证，规则修改或删除后立即生效
+        etag = entry.response_etag()
+        headers = {
+            "Content-Type": entry.content_type,
+            "ETag": etag,
+            "Access-Control-Allow-Origin": "*",
+            "Cache-Control": "no-cache",
+            "Location": redirect_url  # 添加重定向头
+        }
+        if flow.request.headers.get("If-None-Match") == etag:
+            flow.response = http.Response.make(304, b"", headers)
+        else:
+            flow.response = http.Response.make(200, entry.content, headers)
+        logger.debug("已将 %s 替换为目标内容: %s", original_url, redirect_url, rule=match.pattern)
+        return True
+    
+    async def serve_local_file(self, flow: http.HTTPFlow) -> bool:
+        """命中带file的变换规则时直接返回本地文件，读取失败时返回False，请求照常发往上游"""
+        transform = self.settings.url_transforms.match(flow.request.url)
+        if transform is None or transform.file_path is None:
+            return False
+        flow.metadata[RULE_KEY] = transform.pattern
+        try:
+            flow.response = await asyncio.to_thread(transform.make_file_response)
+        except OSError as e:
+            logger.error("读取本地文件失败: %s, URL: %s", e, flow.request.url, rule=transform.pattern)
+            return False
+        return True
+    
+    def serve_theme_asset(self, flow: http.HTTPFlow) -> bool:
+        """URL在主题包中时直接由映射的主题包文件返回，请求带有相同ETag时返回304"""
+        theme_packs = self.settings.theme_packs
+        if not theme_packs:
+            return False
+        asset = theme_packs.get(flow.request.url)
+        if asset is None:
+            return False
+        flow.metadata[RULE_KEY] = f"theme:{asset.pack.name}"
+        headers = {
+            "Content-Type": asset.content_type,
+            "ETag": asset.etag,
+            "Access-Control-Allow-Origin": "*",
+            "Cache-Control": "no-cache",
+        }
+        if flow.request.headers.get("If-None-Match") == asset.etag:
+            flow.response = http.Response.make(304, b"", headers)
+        else:
+            flow.response = http.Response.make(200, asset.content, headers)
+        return True
+    
+    def requestheaders(self, flow: http.HTTPFlow) -> None:
+        """
+        请求头到达时，对带请求体且不需要改写的请求开启流式转发
+        流式请求会在request事件之前连接上游，因此命中替换规则的请求不能流式转发
+        """
+        headers = flow.request.headers
+        if headers.get("Content-Length", "0") == "0" and "Transfer-Encoding" not in headers:
+            return
+        if flow.request.url == LOGIN_URL:
+            return
+        settings = self.settings
+        if settings.hooks.has_match('request', flow) or settings.url_rules.match(flow.request.url):
+            return
+        if settings.url_transforms.match(flow.request.url) is not None:
+            return
+        if settings.theme_packs.get(flow.request.url) is not None:
+            return
+        flow.request.stream = True
+    
+    def responseheaders(self, flow: http.HTTPFlow) -> None:
+        """
+        响应头到达时先应用变换规则的响应头操作(流式转发的响应也生效)，
+        再对没有任何规则或钩子会处理的响应开启流式转发，避免缓冲大文件
+        """
+        transform = self.settings.url_transforms.match(flow.request.url)
+        if transform is not None:
+            transform.apply_headers(flow.response)
+        if self.needs_response_body(flow, transform):
+            return
+        flow.response.stream = True
+    
+    def needs_response_body(self, flow: http.HTTPFlow, transform=None) -> bool:
+        """判断响应阶段是否有逻辑需要读取或改写完整响应体"""
+        if self.is_enabled and flow.request.url in self.target_urls:
+            return True
+        if transform is not None and transform.needs_body:
+            return True
+        return self.settings.hooks.has_match('response', flow)
+    
+    async def response(self, flow: http.HTTPFlow) -> None:
+        start = time.perf_counter()
+        try:
+            await self.handle_response(flow)
+        finally:
+            add_time(flow, HOOK_TIME_KEY, time.perf_counter() - start)
+    
+    async def request(self, flow: http.HTTPFlow) -> None:
+        start = time.perf_counter()
+        try:
+            await self.handle_request(flow)
+        finally:
+            # 替换资源的获取耗时单独统计，不计入插件处理耗时
+            add_time(flow, HOOK_TIME_KEY, time.perf_counter() - start - flow.metadata.get(FETCH_TIME_KEY, 0.0))
+    
+    async def handle_response(self, flow: http.HTTPFlow) -> None:
+        # 首先执行匹配的自定义响应钩子
+        await self.settings.hooks.run('response', flow)
+        
+        # 应用变换规则(替换规则和本地文件构造的响应没有responseheaders事件，响应头在这里设置)
+        transform = self.settings.url_transforms.match(flow.request.url)
+        if transform is not None and flow.response is not None:
+            transform.apply_headers(flow.response)
+            transform.apply_body(flow.response)
         
         # 然后检查是否需要处理其他目标URL
         target_urls = [
@@ -208,21 +439,21 @@ class ResponseModifierAddon:
                 modified_json = json.dumps(response_data, ensure_ascii=False)
                 flow.response.text = modified_json
             
-                ctx.log.info("成功修改响应数据：spelling字段已替换为'a'")
+                logger.info("成功修改响应数据：spelling字段已替换为'a'")
             
             except Exception as e:
-                ctx.log.error(f"处理响应时出错：{str(e)}")
+                logger.error("处理响应时出错：%s", e)
 
-    def request(self, flow: http.HTTPFlow) -> None:
-        # 首先尝试执行自定义请求函数
-        if self.custom_request_func:
-            try:
-                self.custom_request_func(flow)
-            except Exception as e:
-                ctx.log.error(f"执行自定义请求函数时出错: {str(e)}")
+    async def handle_request(self, flow: http.HTTPFlow) -> None:
+        # 首先执行匹配的自定义请求钩子
+        await self.settings.hooks.run('request', flow)
         
-        if flow.request.url == "https://www.hssenglish.com/student/user/login":
-            ctx.log.info(f"拦截到登录请求: {flow.request.url}")
+        # 命中本地文件变换、主题包或URL替换规则时直接返回内容，跳过上游请求
+        if await self.serve_local_file(flow) or self.serve_theme_asset(flow) or await self.apply_url_replacement(flow):
+            return
+        
+        if flow.request.url == LOGIN_URL:
+            logger.info("拦截到登录请求: %s", flow.request.url)
             # 修改请求为POST方法
             flow.request.method = "POST"
             # 设置请求头
@@ -247,13 +478,13 @@ class ResponseModifierAddon:
             timestamp = str(int(time.time() * 1000))
             flow.request.headers["x-uctiming-46938875"] = timestamp
             
-            # 从配置文件获取登录凭据
-            username, password = self.get_login_credentials()
+            # 尚未配置账号密码时等待设置保存(只挂起当前请求，不阻塞事件循环)
+            if not self.credentials_ready.is_set():
+                logger.info("等待账号密码设置...")
+                await self.credentials_ready.wait()
             
-            # 如果没有获取到有效的登录凭据，使用默认值
-            while not username or not password:
-                time.sleep(1)
-                username, password = self.get_login_credentials()
+            # 从设置快照获取登录凭据
+            username, password = self.get_login_credentials()
             # 设置请求内容
             payload = {
                 'userId': username,
@@ -265,7 +496,7 @@ class ResponseModifierAddon:
             flow.request.content = form_data.encode('utf-8')
             flow.request.headers["Content-Length"] = str(len(form_data))
             
-            ctx.log.info("登录请求已修改为指定格式")
+            logger.info("登录请求已修改为指定格式")
 
     def format_response_json(self, flow: http.HTTPFlow):
         """格式化JSON响应"""
@@ -0,0 +1,240 @@
+"""
+替换资源缓存模块 - 内存LRU + 磁盘缓存
+"""
+
+import hashlib, json, os, re, threading, time
+from collections import OrderedDict
+
+from .paths import get_app_data_dir
+
+# 源站未声明max-age时的默认新鲜期(秒)
+DEFAULT_MAX_AGE = 3600
+
+class CacheEntry:
+    """
+    单个缓存条目 - 目标URL对应的内容及其重新验证信息
+    """
+
+    __slots__ = ('url', 'content', 'content_type', 'etag', 'last_modified', 'fetched_at', 'max_age')
+
+    def __init__(self, url, content, content_type, etag=None, last_modified=None, fetched_at=None, max_age=DEFAULT_MAX_AGE):
+        self.url = url
+        self.content = content
+        self.content_type = content_type
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fetched_at = fetched_at or time.time()
+        self.max_age = max_age
+
+    @property
+    def size(self):
+        return len(self.content)
+
+    def is_fresh(self):
+        """是否仍在新鲜期内(无需重新验证)"""
+        return time.time() - self.fetched_at < self.max_age
+
+    def response_etag(self):
+        """替换响应使用的ETag: 优先使用源站的ETag，否则由大小和获取时间生成(内容更新后随之变化)"""
+        return self.etag or f'W/"{self.size}-{int(self.fetched_at)}"'
+
+    def validators(self):
+        """生成条件请求头，用于ETag/Last-Modified重新验证"""
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+    def meta(self):
+        """磁盘元数据(不含内容)"""
+        return {
+            'url': self.url,
+            'content_type': self.content_type,
+            'etag': self.etag,
+            'last_modified': self.last_modified,
+            'fetched_at': self.fetched_at,
+            'max_age': self.max_age,
+        }
+
+def is_no_store(cache_control):
+    """源站是否禁止保存该响应(Cache-Control: no-store)"""
+    return bool(cache_control) and 'no-store' in cache_control
+
+def parse_max_age(cache_control):
+    """从Cache-Control头中解析max-age，解析失败返回默认值"""
+    if cache_control:
+        if 'no-cache' in cache_control or 'no-store' in cache_control:
+            return 0
+        match = re.search(r'max-age=(\d+)', cache_control)
+        if match:
+            return int(match.group(1))
+    return DEFAULT_MAX_AGE
+
+class AssetCache:
+    """
+    资源缓存 - 按目标URL缓存替换内容
+    内存中为按字节预算淘汰的LRU，磁盘缓存位于应用数据目录下，重启后可预加载
+    磁盘缓存同样按字节预算淘汰，写入时删除最久未写入的文件
+    """
+
+    def __init__(self, max_memory_bytes=64 * 1024 * 1024, max_disk_bytes=256 * 1024 * 1024, cache_dir=None):
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.cache_dir = cache_dir or get_app_data_dir("asset_cache")
+        self.entries = OrderedDict()  # url -> CacheEntry，按最近使用排序
+        self.memory_bytes = 0
+        self.lock = threading.Lock()  # 预加载和磁盘读取在线程池中进行
+        self.disk_files = OrderedDict()  # 磁盘文件路径前缀 -> 内容大小，按写入时间排序
+        self.disk_bytes = 0
+        self.disk_lock = threading.Lock()
+
+    def get_entry_path(self, url):
+        """获取URL对应的磁盘文件路径前缀"""
+        digest = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, digest)
+
+    def get(self, url):
+        """从内存LRU中获取条目，未命中返回None"""
+        with self.lock:
+            entry = self.entries.get(url)
+            if entry is not None:
+                self.entries.move_to_end(url)
+            return entry
+
+    def put(self, entry):
+        """放入内存LRU，超出字节预算时淘汰最久未使用的条目"""
+        if entry.size > self.max_memory_bytes:
+            return
+        with self.lock:
+            old = self.entries.pop(entry.url, None)
+            if old is not None:
+                self.memory_bytes -= old.size
+            self.entries[entry.url] = entry
+            self.memory_bytes += entry.size
+            while self.memory_bytes > self.max_memory_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.memory_bytes -= evicted.size
+
+    def remove(self, url):
+        """从内存和磁盘中删除条目(源站改为禁止保存时调用，磁盘部分为阻塞IO)"""
+        with self.lock:
+            old = self.entries.pop(url, None)
+            if old is not None:
+                self.memory_bytes -= old.size
+        path = self.get_entry_path(url)
+        with self.disk_lock:
+            self.disk_bytes -= self.disk_files.pop(path, 0)
+        self.remove_files(path)
+
+    @staticmethod
+    def remove_files(path):
+        for suffix in ('.json', '.bin'):
+            try:
+                os.remove(path + suffix)
+            except OSError:
+                pass
+
+    def track_disk_file(self, path, size):
+        """记录刚写入的磁盘文件，超出磁盘预算时删除最久未写入的文件"""
+        with self.disk_lock:
+            self.disk_bytes -= self.disk_files.pop(path, 0)
+            self.disk_files[path] = size
+            self.disk_bytes += size
+            self.evict_disk()
+
+    def evict_disk(self):
+        """删除最旧的文件直到不超出磁盘预算(持有disk_lock时调用)"""
+        while self.disk_bytes > self.max_disk_bytes and self.disk_files:
+            path, size = self.disk_files.popitem(last=False)
+            self.disk_bytes -= size
+            self.remove_files(path)
+
+    def load_from_disk(self, url):
+        """从磁盘读取条目并放入内存(阻塞IO，应在线程中调用)"""
+        path = self.get_entry_path(url)
+        try:
+            with open(path + '.json', 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            with open(path + '.bin', 'rb') as f:
+                content = f.read()
+        except (OSError, ValueError):
+            return None
+        if meta.get('url') != url:
+            return None
+        entry = CacheEntry(content=content, **meta)
+        self.put(entry)
+        return entry
+
+    def save_to_disk(self, entry):
+        """写入磁盘缓存(阻塞IO，应在线程中调用)，超出磁盘预算的条目不写入"""
+        if entry.size > self.max_disk_bytes:
+            return
+        path = self.get_entry_path(entry.url)
+        try:
+            with open(path + '.bin.tmp', 'wb') as f:
+                f.write(entry.content)
+            os.replace(path + '.bin.tmp', path + '.bin')
+            self.save_meta(entry)
+        except OSError:
+            return
+        self.track_disk_file(path, entry.size)
+
+    def save_meta(self, entry):
+        """仅更新磁盘元数据(重新验证成功后刷新时间戳)"""
+        path = self.get_entry_path(entry.url)
+        try:
+            with open(path + '.json.tmp', 'w', encoding='utf-8') as f:
+                json.dump(entry.meta(), f, ensure_ascii=False)
+            os.replace(path + '.json.tmp', path + '.json')
+        except OSError:
+            pass
+
+    def preload(self):
+        """
+        启动时预加载磁盘缓存到内存(阻塞IO，应在线程中调用)
+        按最近写入优先加载，并清理超出磁盘预算的旧文件
+        返回加载的条目数
+        """
+        try:
+            names = [n for n in os.listdir(self.cache_dir) if n.endswith('.json')]
+        except OSError:
+            return 0
+        metas = []
+        for name in names:
+            path = os.path.join(self.cache_dir, name[:-len('.json')])
+            try:
+                metas.append((os.path.getmtime(path + '.json'), os.path.getsize(path + '.bin'), path))
+            except OSError:
+                continue
+        metas.sort()
+
+        with self.disk_lock:
+            # 预加载期间新写入的文件已被记录，排在最后
+            written = self.disk_files
+            self.disk_files = OrderedDict((path, size) for _, size, path in metas if path not in written)
+            self.disk_files.update(written)
+            self.disk_bytes = sum(self.disk_files.values())
+            self.evict_disk()
+            files = list(reversed(self.disk_files.items()))
+
+        loaded = []
+        memory_bytes = self.memory_bytes
+        for path, size in files:
+            if memory_bytes + size > self.max_memory_bytes:
+                continue
+            try:
+                with open(path + '.json', 'r', encoding='utf-8') as f:
+                    meta = json.load(f)
+                with open(path + '.bin', 'rb') as f:
+                    content = f.read()
+            except (OSError, ValueError):
+                continue
+            loaded.append(CacheEntry(content=content, **meta))
+            memory_bytes += size
+
+        # 由旧到新放入，使最近写入的条目最晚被淘汰
+        for entry in reversed(loaded):
+            self.put(entry)
+        return len(loaded)
@@ -0,0 +1,130 @@
+"""
+叶子证书缓存模块 - 将mitmproxy为各主机签发的伪造证书保存到磁盘，下次启动直接读取
+"""
+
+import datetime, hashlib, os
+from cryptography.exceptions import InvalidSignature
+from mitmproxy import certs, ctx
+
+from .log_service import get_logger
+from .paths import get_app_data_dir
+
+# 证书剩余有效期少于该时间时重新签发
+RENEW_BEFORE = datetime.timedelta(days=7)
+# 内存中最多保留的证书条目数
+MAX_MEMORY_ENTRIES = 512
+
+logger = get_logger("cert_cache")
+
+def cert_cache_key(commonname, sans, organization):
+    """由通用名、SAN和组织名生成缓存键(与mitmproxy签发证书时使用的参数一致)"""
+    names = ','.join(sorted(str(name.value) for name in sans))
+    return hashlib.sha256(f"{commonname}|{organization}|{names}".encode('utf-8')).hexdigest()
+
+class LeafCertCache:
+    """
+    叶子证书缓存插件 - 需添加在TlsConfig之后，包装其证书库的get_cert
+    mitmproxy的叶子证书使用CA私钥作为密钥，磁盘上只保存证书本身(不含私钥)；
+    读取时校验有效期和签发CA，CA重新生成后旧证书自动失效
+    """
+
+    def __init__(self, cache_dir=None):
+        self.cache_dir = cache_dir or get_app_data_dir("certs")
+        self.certstore = None  # 当前包装的证书库
+        self.entries = {}  # 缓存键 -> CertStoreEntry
+        self.hits = 0
+        self.generated = 0
+
+    def running(self):
+        # TlsConfig在running时才创建证书库
+        self.wrap_certstore()
+
+    def configure(self, updated):
+        # TlsConfig在证书相关选项变化时会重建证书库，此时重新包装
+        self.wrap_certstore()
+
+    def wrap_certstore(self):
+        """包装TlsConfig当前证书库的get_cert，先查内存和磁盘缓存，未命中时才签发"""
+        certstore = ctx.master.addons.get("tlsconfig").certstore
+        if certstore is None or certstore is self.certstore:
+            return
+        self.entries.clear()
+        self.certstore = certstore
+        if ctx.options.certs:
+            return  # 手动指定了证书时保持mitmproxy的默认行为
+        original_get_cert = certstore.get_cert
+
+        def get_cert(commonname, sans, organization=None):
+            sans = list(sans)
+            key = cert_cache_key(commonname, sans, organization)
+            entry = self.entries.get(key)
+            if entry is not None and self.is_fresh(entry.cert):
+                return entry
+            entry = self.load_cert(key)
+            if entry is None:
+                entry = original_get_cert(commonname, sans, organization)
+                self.generated += 1
+                self.save_cert(key, entry.cert)
+            else:
+                self.hits += 1
+            if len(self.entries) >= MAX_MEMORY_ENTRIES:
+                self.entries.pop(next(iter(self.entries)))
+            self.entries[key] = entry
+            return entry
+
+        certstore.get_cert = get_cert
+
+    def get_path(self, key):
+        return os.path.join(self.cache_dir, key + ".pem")
+
+    def is_fresh(self, cert: certs.Cert) -> bool:
+        """证书未临近过期"""
+        return cert.notafter - datetime.datetime.now(datetime.timezone.utc) >= RENEW_BEFORE
+
+    def is_valid(self, cert: certs.Cert) -> bool:
+        """证书未临近过期且由当前CA签发"""
+        if not self.is_fresh(cert):
+            return False
+        try:
+            cert._cert.verify_directly_issued_by(self.certstore.default_ca._cert)
+        except (ValueError, TypeError, InvalidSignature):
+            return False
+        return True
+
+    def load_cert(self, key):
+        """从磁盘读取证书，不存在或已失效时返回None"""
+        path = self.get_path(key)
+        try:
+            with open(path, 'rb') as f:
+                cert = certs.Cert.from_pem(f.read())
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            cert = None
+        if cert is None or not self.is_valid(cert):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        return certs.CertStoreEntry(
+            cert=cert,
+            privatekey=self.certstore.default_privatekey,
+            chain_file=self.certstore.default_chain_file,
+            chain_certs=self.certstore.default_chain_certs,
+        )
+
+    def save_cert(self, key, cert: certs.Cert):
+        """原子地写入证书文件(先写临时文件再替换)"""
+        path = self.get_path(key)
+        tmp_path = path + ".tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(cert.to_pem())
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warn("保存证书缓存失败: %s", e)
+
+    def stats(self):
+        """证书缓存统计(可JSON序列化)"""
+        return {'disk_hits': self.hits, 'generated': self.generated, 'memory_entries': len(self.entries)}
@@ -0,0 +1,132 @@
+"""
+上游连接管理模块 - 限制每个主机同时进行的连接建立(TCP + TLS握手)数并统计连接复用情况
+"""
+
+import asyncio, threading
+from mitmproxy import http
+from mitmproxy import tls
+from mitmproxy.proxy import server_hooks
+
+from .log_service import get_logger
+
+# 每个主机默认同时进行的连接建立数，可在设置的max_handshakes_per_host中修改(0表示不限制)
+# 只限制建立阶段: mitmproxy的上游连接属于各自的客户端连接，限制已打开的连接数会让请求等待其他客户端的空闲连接
+DEFAULT_MAX_HANDSHAKES_PER_HOST = 6
+# 等待名额的最长时间(秒)，超时后直接建立连接，握手卡住时不会拖住后续请求
+CONNECT_WAIT_TIMEOUT = 5.0
+
+logger = get_logger("connections")
+
+class HostStats:
+    """单个主机的上游连接统计"""
+
+    __slots__ = ('opened', 'tls', 'http2', 'requests', 'reused', 'waited', 'active')
+
+    def __init__(self):
+        self.opened = 0  # 建立的连接数
+        self.tls = 0  # 使用TLS的连接数
+        self.http2 = 0  # 协商为HTTP/2的连接数
+        self.requests = 0  # 经上游连接发出的请求数
+        self.reused = 0  # 复用已有连接的请求数
+        self.waited = 0  # 因达到握手并发上限而排队的连接数
+        self.active = 0  # 当前打开的连接数
+
+    def as_dict(self):
+        data = {name: getattr(self, name) for name in self.__slots__}
+        data['reuse_ratio'] = round(self.reused / self.requests, 3) if self.requests else None
+        return data
+
+class ConnectionLimiter:
+    """
+    上游连接插件 - 同一主机同时握手的连接数不超过上限，避免页面加载时瞬间发起大量握手；
+    并记录每条连接承载的请求数，复用率反映浏览器keep-alive/HTTP/2的效果
+    """
+
+    def __init__(self, max_per_host=DEFAULT_MAX_HANDSHAKES_PER_HOST):
+        self.max_per_host = max_per_host
+        self.semaphores = {}  # 主机 -> asyncio.Semaphore
+        self.holding = set()  # 正在建立且占用了名额的上游连接ID
+        self.flow_counts = {}  # 上游连接ID -> 已承载的请求数
+        self.by_host = {}  # 主机 -> HostStats
+        self.lock = threading.Lock()  # 统计面板在GUI线程读取
+
+    def host_stats(self, host) -> HostStats:
+        stats = self.by_host.get(host)
+        if stats is None:
+            with self.lock:
+                stats = self.by_host.setdefault(host, HostStats())
+        return stats
+
+    async def server_connect(self, data: server_hooks.ServerConnectionHookData):
+        """建立上游连接前获取该主机的握手名额"""
+        if not self.max_per_host or data.server.address is None:
+            return
+        host = data.server.address[0]
+        semaphore = self.semaphores.get(host)
+        if semaphore is None:
+            semaphore = self.semaphores[host] = asyncio.Semaphore(self.max_per_host)
+        if semaphore.locked():
+            self.host_stats(host).waited += 1
+            try:
+                await asyncio.wait_for(semaphore.acquire(), CONNECT_WAIT_TIMEOUT)
+            except asyncio.TimeoutError:
+                logger.debug("等待 %s 的连接名额超时，直接建立连接", host)
+                return
+        else:
+            await semaphore.acquire()
+        self.holding.add(data.server.id)
+
+    def server_connected(self, data: server_hooks.ServerConnectionHookData):
+        stats = self.host_stats(data.server.address[0])
+        stats.opened += 1
+        stats.active += 1
+        if not data.server.tls:
+            self.release(data.server)
+
+    def tls_established_server(self, data: tls.TlsData):
+        self.release(data.conn)
+
+    def tls_failed_server(self, data: tls.TlsData):
+        self.release(data.conn)
+
+    def server_disconnected(self, data: server_hooks.ServerConnectionHookData):
+        self.flow_counts.pop(data.server.id, None)
+        self.host_stats(data.server.address[0]).active -= 1
+        self.release(data.server)
+
+    def server_connect_error(self, data: server_hooks.ServerConnectionHookData):
+        self.release(data.server)
+
+    def release(self, server):
+        """连接建立完成(或失败、关闭)时归还名额，每条连接只归还一次"""
+        if server.id in self.holding:
+            self.holding.discard(server.id)
+            self.semaphores[server.address[0]].release()
+
+    def response(self, flow: http.HTTPFlow) -> None:
+        """记录请求所在的上游连接，同一连接上的第二个及以后的请求计为复用"""
+        server = flow.server_conn
+        if server is None or server.timestamp_start is None or server.address is None:
+            return  # 由插件直接构造响应，没有经过上游
+        count = self.flow_counts.get(server.id, 0) + 1
+        self.flow_counts[server.id] = count
+        stats = self.host_stats(server.address[0])
+        stats.requests += 1
+        if count > 1:
+            stats.reused += 1
+        else:
+            # TLS握手在server_connected之后才完成，在连接的第一个响应时记录
+            if server.tls_established:
+                stats.tls += 1
+            if server.alpn == b"h2":
+                stats.http2 += 1
+
+    def snapshot(self):
+        """按主机汇总的连接统计(可JSON序列化)"""
+        with self.lock:
+            hosts = {host: stats.as_dict() for host, stats in self.by_host.items()}
+        total = HostStats()
+        for stats in hosts.values():
+            for name in HostStats.__slots__:
+                setattr(total, name, getattr(total, name) + stats[name])
+        return {'max_per_host': self.max_per_host, 'total': total.as_dict(), 'hosts': hosts}
@@ -0,0 +1,11 @@
+"""
+常量模块 - 界面进程与代理进程共用的常量，不依赖mitmproxy
+"""
+
+# 访问该主机即可获取JSON格式的统计数据，例如 http://greenwood-tree.stats/
+STATS_HOST = "greenwood-tree.stats"
+
+# flow.metadata中由ResponseModifierAddon写入的计时字段
+HOOK_TIME_KEY = "greenwood.hook_time"
+FETCH_TIME_KEY = "greenwood.fetch_time"
+RULE_KEY = "greenwood.rule"
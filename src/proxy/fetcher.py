@@ -0,0 +1,123 @@
+"""
+替换资源获取模块 - 基于连接池的异步HTTP客户端
+"""
+
+import asyncio, time
+import httpx
+
+from .asset_cache import CacheEntry, is_no_store, parse_max_age
+
+# 未在规则中单独指定时使用的默认超时(秒)
+DEFAULT_TIMEOUT = 10.0
+# 连接池上限: 总连接数、保持空闲的连接数、空闲连接保留时间(秒)
+MAX_CONNECTIONS = 32
+MAX_KEEPALIVE_CONNECTIONS = 16
+KEEPALIVE_EXPIRY = 60
+
+class FetchError(Exception):
+    """目标内容获取失败"""
+
+class AssetFetcher:
+    """
+    异步资源获取器 - 复用keep-alive连接获取URL替换的目标内容
+    """
+
+    def __init__(self, timeout: float = DEFAULT_TIMEOUT, cache=None):
+        self.timeout = timeout
+        self.cache = cache  # 可选的AssetCache
+        self.client = None  # 在代理事件循环中懒创建
+        self.pending = {}  # URL -> 进行中的获取任务，同一URL的并发请求共用一次获取
+
+    def get_client(self) -> httpx.AsyncClient:
+        """获取共享的异步客户端(必须在事件循环中调用)"""
+        if self.client is None:
+            self.client = httpx.AsyncClient(
+                follow_redirects=True,
+                timeout=self.timeout,
+                # 同一CDN上的多个替换资源共用一条HTTP/2连接(h2随mitmproxy安装)
+                http2=True,
+                limits=httpx.Limits(
+                    max_connections=MAX_CONNECTIONS,
+                    max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=KEEPALIVE_EXPIRY,
+                ),
+            )
+        return self.client
+
+    async def fetch(self, url: str, timeout: float = None, headers: dict = None) -> httpx.Response:
+        """获取目标内容，timeout为空时使用默认超时"""
+        client = self.get_client()
+        return await client.get(url, headers=headers, timeout=timeout or self.timeout)
+
+    async def fetch_asset(self, url: str, timeout: float = None) -> CacheEntry:
+        """
+        获取目标内容并经过缓存
+        新鲜条目直接返回；过期条目使用ETag/Last-Modified重新验证；
+        源站出错时若有旧条目则返回旧条目，否则抛出FetchError
+        预热和浏览器同时请求同一URL时只获取一次
+        """
+        task = self.pending.get(url)
+        if task is None:
+            task = asyncio.ensure_future(self.load_asset(url, timeout))
+            self.pending[url] = task
+            task.add_done_callback(lambda _: self.pending.pop(url, None))
+        # shield: 某个调用方被取消时不影响其他等待同一结果的调用方
+        return await asyncio.shield(task)
+
+    async def load_asset(self, url: str, timeout: float = None) -> CacheEntry:
+        """fetch_asset的实际实现"""
+        entry = None
+        if self.cache is not None:
+            entry = self.cache.get(url)
+            if entry is None:
+                entry = await asyncio.to_thread(self.cache.load_from_disk, url)
+            if entry is not None and entry.is_fresh():
+                return entry
+
+        try:
+            response = await self.fetch(url, timeout=timeout, headers=entry.validators() if entry else None)
+        except httpx.HTTPError:
+            if entry is not None:
+                return entry
+            raise
+
+        cache_control = response.headers.get("Cache-Control")
+        if response.status_code == 304 and entry is not None:
+            entry.fetched_at = time.time()
+            entry.max_age = parse_max_age(cache_control)
+            if self.cache is not None:
+                if is_no_store(cache_control):
+                    await asyncio.to_thread(self.cache.remove, url)
+                else:
+                    await asyncio.to_thread(self.cache.save_meta, entry)
+            return entry
+
+        if response.status_code != 200:
+            if entry is not None:
+                return entry
+            raise FetchError(f"获取目标内容失败，状态码: {response.status_code}, URL: {url}")
+
+        previous = entry
+        entry = CacheEntry(
+            url,
+            response.content,
+            response.headers.get("Content-Type", "application/octet-stream"),
+            etag=response.headers.get("ETag"),
+            last_modified=response.headers.get("Last-Modified"),
+            max_age=parse_max_age(cache_control),
+        )
+        if self.cache is not None:
+            if is_no_store(cache_control):
+                # 源站禁止保存: 不放入缓存，并删除之前缓存的旧内容
+                if previous is not None:
+                    await asyncio.to_thread(self.cache.remove, url)
+            else:
+                self.cache.put(entry)
+                await asyncio.to_thread(self.cache.save_to_disk, entry)
+        return entry
+
+    async def close(self):
+        """关闭连接池"""
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
@@ -0,0 +1,168 @@
+"""
+自定义钩子模块 - 预编译、带过滤条件和耗时预算的用户请求/响应函数
+"""
+
+import asyncio, builtins, inspect, re, time
+from mitmproxy import http
+
+from .log_service import get_logger
+
+# 单次钩子调用的默认耗时预算(毫秒)
+DEFAULT_BUDGET_MS = 50
+# 同步钩子连续超时达到该次数后被跳过，直到设置重新加载
+MAX_OVERRUNS = 3
+
+logger = get_logger("hooks")
+
+def hook(url=None, host=None, content_type=None):
+    """
+    钩子声明装饰器(在自定义代码中使用)
+    url: 正则表达式，在完整URL中搜索
+    host: 主机名或主机名列表，以.开头表示匹配该域名及其子域名
+    content_type: Content-Type中需包含的字符串，如 "json"
+    """
+    def decorator(func):
+        func.__hook_filters__ = {'url': url, 'host': host, 'content_type': content_type}
+        return func
+    return decorator
+
+class UserHook:
+    """
+    单个用户钩子 - 过滤条件在编译时处理好，每次调用记录耗时
+    """
+
+    def __init__(self, name, stage, func, url=None, host=None, content_type=None):
+        self.name = name
+        self.stage = stage  # 'request' 或 'response'
+        self.func = func
+        self.is_async = inspect.iscoroutinefunction(func)
+        self.url = re.compile(url) if url else None
+        if isinstance(host, str):
+            host = [host]
+        self.hosts = tuple(h.lower() for h in host) if host else None
+        self.content_type = content_type.lower() if content_type else None
+        # 统计信息
+        self.calls = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.overruns = 0
+        self.disabled = False
+
+    def match_host(self, host):
+        for h in self.hosts:
+            if host == h or (h.startswith('.') and (host.endswith(h) or host == h[1:])):
+                return True
+        return False
+
+    def matches(self, flow: http.HTTPFlow):
+        """判断钩子是否需要处理该请求"""
+        if self.hosts is not None and not self.match_host(flow.request.pretty_host.lower()):
+            return False
+        if self.url is not None and not self.url.search(flow.request.url):
+            return False
+        if self.content_type is not None:
+            message = flow.response if self.stage == 'response' else flow.request
+            if message is None or self.content_type not in message.headers.get('Content-Type', '').lower():
+                return False
+        return True
+
+    def record(self, elapsed, budget):
+        """记录一次调用耗时，返回是否超出预算"""
+        self.calls += 1
+        self.total_time += elapsed
+        self.max_time = max(self.max_time, elapsed)
+        if elapsed > budget:
+            self.overruns += 1
+            return True
+        self.overruns = 0
+        return False
+
+    def stats(self):
+        return {
+            'name': self.name,
+            'stage': self.stage,
+            'calls': self.calls,
+            'avg_ms': round(self.total_time / self.calls * 1000, 3) if self.calls else 0,
+            'max_ms': round(self.max_time * 1000, 3),
+            'disabled': self.disabled,
+        }
+
+def compile_hooks(source, stage, legacy_name, exec_globals):
+    """
+    编译一段自定义代码并收集其中的钩子
+    使用@hook装饰的函数按定义顺序注册；未装饰的旧式函数(custom_request/custom_response)作为无过滤钩子注册
+    代码语法错误时抛出SyntaxError
+    """
+    code = compile(source, f'<{legacy_name}>', 'exec')
+    namespace = {'__builtins__': builtins, '__name__': legacy_name, 'hook': hook}
+    namespace.update(exec_globals)
+    exec(code, namespace)
+
+    hooks = []
+    for name, value in list(namespace.items()):
+        filters = getattr(value, '__hook_filters__', None)
+        if callable(value) and filters is not None:
+            hooks.append(UserHook(name, stage, value, **filters))
+    legacy = namespace.get(legacy_name)
+    if callable(legacy) and not hasattr(legacy, '__hook_filters__'):
+        hooks.append(UserHook(legacy_name, stage, legacy))
+    return hooks
+
+class HookPipeline:
+    """
+    钩子管道 - 按阶段依次执行匹配的钩子
+    异步钩子超出预算会被取消；同步钩子无法中断，超出预算会记录日志，连续多次超时后跳过
+    """
+
+    def __init__(self, hooks=(), budget_ms=DEFAULT_BUDGET_MS):
+        self.budget = budget_ms / 1000
+        self.stages = {'request': [], 'response': []}
+        for h in hooks:
+            self.stages[h.stage].append(h)
+
+    def __bool__(self):
+        return bool(self.stages['request'] or self.stages['response'])
+
+    def all_hooks(self):
+        return self.stages['request'] + self.stages['response']
+
+    def has_match(self, stage, flow: http.HTTPFlow):
+        """是否有该阶段的钩子需要处理该请求(用于判断是否可以流式转发)"""
+        return any(not h.disabled and h.matches(flow) for h in self.stages[stage])
+
+    def hosts(self):
+        """
+        返回钩子可能处理的主机名集合(以.开头表示含子域名)
+        存在未声明host过滤条件的钩子时返回None
+        """
+        hosts = set()
+        for h in self.all_hooks():
+            if h.hosts is None:
+                return None
+            hosts.update(h.hosts)
+        return hosts
+
+    async def run(self, stage, flow: http.HTTPFlow):
+        """执行某一阶段所有匹配的钩子"""
+        for h in self.stages[stage]:
+            if h.disabled or not h.matches(flow):
+                continue
+            start = time.perf_counter()
+            try:
+                if h.is_async:
+                    await asyncio.wait_for(h.func(flow), self.budget)
+                else:
+                    h.func(flow)
+            except asyncio.TimeoutError:
+                logger.warn("自定义钩子 %s 超出耗时预算 %.0fms，已取消: %s", h.name, self.budget * 1000, flow.request.url)
+            except Exception as e:
+                logger.error("执行自定义钩子 %s 时出错: %s", h.name, e)
+            elapsed = time.perf_counter() - start
+            if h.record(elapsed, self.budget) and not h.is_async:
+                logger.warn("自定义钩子 %s 耗时 %.1fms，超出预算 %.0fms", h.name, elapsed * 1000, self.budget * 1000)
+                if h.overruns >= MAX_OVERRUNS:
+                    h.disabled = True
+                    logger.warn("自定义钩子 %s 连续 %d 次超时，已跳过，重新保存设置后恢复", h.name, MAX_OVERRUNS)
+
+    def stats(self):
+        return [h.stats() for h in self.all_hooks()]
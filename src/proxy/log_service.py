@@ -0,0 +1,183 @@
+"""
+日志服务模块 - 代理线程使用的异步批量结构化日志
+调用方只做级别判断和入队，格式化与写文件都在后台线程中批量完成
+"""
+
+import atexit, json, logging, os, queue, sys, threading, time
+
+from .paths import get_app_data_dir
+
+DEBUG, INFO, WARN, ERROR = 10, 20, 30, 40
+LEVEL_NAMES = {DEBUG: 'debug', INFO: 'info', WARN: 'warn', ERROR: 'error'}
+LEVELS = {name: level for level, name in LEVEL_NAMES.items()}
+
+_STOP = object()
+
+class LogWriter:
+    """
+    后台日志写入器 - 从无锁队列中批量取出记录，格式化后写入按大小轮转的日志文件
+    """
+
+    def __init__(self, path, max_bytes=5 * 1024 * 1024, backup_count=3, console=True,
+                 batch_size=256, flush_interval=0.5):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.console = console
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.SimpleQueue()  # put不加Python层的锁，可在任意线程和信号处理中调用
+        self.file = None
+        self.thread = threading.Thread(target=self.run, name="Log-Writer", daemon=True)
+        self.thread.start()
+
+    def put(self, record):
+        self.queue.put(record)
+
+    def open_file(self):
+        if self.file is None:
+            self.file = open(self.path, 'a', encoding='utf-8')
+
+    def rotate(self):
+        """日志文件超过大小上限时轮转: proxy.log -> proxy.log.1 -> ..."""
+        self.file.close()
+        self.file = None
+        for i in range(self.backup_count - 1, 0, -1):
+            src = f"{self.path}.{i}"
+            if os.path.exists(src):
+                os.replace(src, f"{self.path}.{i + 1}")
+        if self.backup_count > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+    @staticmethod
+    def format(record):
+        """将记录格式化为一行JSON"""
+        timestamp, level, name, msg, args, fields = record
+        if args:
+            try:
+                msg = msg % args
+            except (TypeError, ValueError):
+                msg = f"{msg} {args}"
+        entry = {
+            'time': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(timestamp)) + f".{int(timestamp * 1000) % 1000:03d}",
+            'level': LEVEL_NAMES.get(level, str(level)),
+            'logger': name,
+            'msg': msg,
+        }
+        if fields:
+            entry.update(fields)
+        return json.dumps(entry, ensure_ascii=False, default=str), msg
+
+    def write_batch(self, batch):
+        lines = []
+        for record in batch:
+            line, msg = self.format(record)
+            lines.append(line)
+            if self.console:
+                print(f"[{LEVEL_NAMES.get(record[1], record[1])}] {msg}", file=sys.stderr if record[1] >= WARN else sys.stdout)
+        try:
+            self.open_file()
+            self.file.write('\n'.join(lines) + '\n')
+            self.file.flush()
+            if self.file.tell() > self.max_bytes:
+                self.rotate()
+        except OSError:
+            self.file = None
+
+    def run(self):
+        while True:
+            try:
+                record = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            batch = []
+            stop = False
+            while True:
+                if record is _STOP:
+                    stop = True
+                    break
+                batch.append(record)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    record = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+            if batch:
+                self.write_batch(batch)
+            if stop:
+                break
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def close(self, timeout=2.0):
+        """写完队列中剩余的记录后停止"""
+        self.queue.put(_STOP)
+        self.thread.join(timeout)
+
+class Logger:
+    """
+    结构化日志记录器 - 低于当前级别的调用在格式化之前直接返回
+    用法: logger.info("已替换 %s -> %s", original, target, rule=pattern)
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def log(self, level, msg, *args, **fields):
+        if level < _state['level'] or _state['writer'] is None:
+            return
+        _state['writer'].put((time.time(), level, self.name, msg, args, fields))
+
+    def debug(self, msg, *args, **fields):
+        self.log(DEBUG, msg, *args, **fields)
+
+    def info(self, msg, *args, **fields):
+        self.log(INFO, msg, *args, **fields)
+
+    def warn(self, msg, *args, **fields):
+        self.log(WARN, msg, *args, **fields)
+
+    def error(self, msg, *args, **fields):
+        self.log(ERROR, msg, *args, **fields)
+
+class QueueLogHandler(logging.Handler):
+    """将标准logging的记录(mitmproxy自身、自定义钩子中的ctx.log)转入日志队列，不在调用线程格式化"""
+
+    def emit(self, record):
+        writer = _state['writer']
+        if writer is not None:
+            writer.put((record.created, record.levelno, record.name, record.msg, record.args, None))
+
+# 当前日志级别和写入器，由configure_logging设置
+_state = {'level': INFO, 'writer': None}
+
+def get_logger(name):
+    """获取指定名称的日志记录器"""
+    return Logger(name)
+
+def configure_logging(level='info', path=None, console=True):
+    """
+    启动日志写入线程并设置级别
+    level: debug/info/warn/error；path默认为应用数据目录下的logs/proxy.log
+    """
+    _state['level'] = LEVELS.get(level, INFO)
+    if _state['writer'] is None:
+        path = path or os.path.join(get_app_data_dir("logs"), "proxy.log")
+        _state['writer'] = LogWriter(path, console=console)
+        atexit.register(shutdown_logging)
+
+        logging.getLogger().addHandler(QueueLogHandler())
+        # httpx每个请求都会记一条info日志，替换资源的获取已由addons记录
+        logging.getLogger('httpx').setLevel(logging.WARNING)
+    logging.getLogger().setLevel(_state['level'])
+
+def shutdown_logging():
+    """写完剩余日志并停止写入线程"""
+    writer = _state['writer']
+    if writer is not None:
+        _state['writer'] = None
+        writer.close()
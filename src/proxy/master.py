@@ -0,0 +1,41 @@
+"""
+精简代理主控模块 - 只加载内嵌代理需要的mitmproxy插件
+"""
+
+from mitmproxy import options
+from mitmproxy.addons import core, disable_h2c, dumper, errorcheck, next_layer, proxyserver, tlsconfig
+from mitmproxy.master import Master
+
+# 默认代理选项，可在设置的proxy_options中覆盖
+DEFAULT_PROXY_OPTIONS = {
+    # 上游优先协商HTTP/2，页面的大量小请求在同一条TLS连接上多路复用
+    'http2': True,
+    # 空闲的HTTP/2连接定期发送PING，避免被服务器关闭后重新握手
+    'http2_ping_keepalive': 30,
+}
+
+class ProxyMaster(Master):
+    """
+    精简的mitmproxy主控 - 替代DumpMaster
+    不加载回放、保存、导出等用不到的插件；流量输出(Dumper)默认关闭，可在运行时开关
+    日志不使用TermLog同步打印，由log_service在后台线程批量写出
+    """
+
+    def __init__(self, opts: options.Options, flow_output: bool = False):
+        super().__init__(opts, with_termlog=False)
+        self.addons.add(
+            core.Core(),
+            proxyserver.Proxyserver(),
+            next_layer.NextLayer(),
+            tlsconfig.TlsConfig(),
+            disable_h2c.DisableH2C(),
+            dumper.Dumper(),
+            errorcheck.ErrorCheck(),
+        )
+        self.options.update(flow_detail=1 if flow_output else 0)
+
+    def set_flow_output(self, enabled: bool):
+        """开关每个请求的控制台输出(可在任意线程调用)"""
+        self.event_loop.call_soon_threadsafe(
+            lambda: self.options.update(flow_detail=1 if enabled else 0)
+        )
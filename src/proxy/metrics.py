@@ -0,0 +1,150 @@
+"""
+代理性能统计模块 - 按主机和规则记录每个请求的耗时与流量
+"""
+
+import json, threading, time
+from collections import deque
+from mitmproxy import http
+
+from .constants import FETCH_TIME_KEY, HOOK_TIME_KEY, RULE_KEY, STATS_HOST
+
+# 记录的指标，单位为秒(bytes除外)；connect为上游连接建立耗时，client_connect为浏览器到代理的连接建立耗时
+FIELDS = ('connect', 'client_connect', 'ttfb', 'total', 'hook', 'fetch', 'bytes')
+
+# 记住最近多少个已统计过建立耗时的客户端连接
+CLIENT_CONN_HISTORY = 1024
+
+def add_time(flow: http.HTTPFlow, key: str, seconds: float):
+    """在flow.metadata中累加一段耗时"""
+    flow.metadata[key] = flow.metadata.get(key, 0.0) + seconds
+
+def percentile(sorted_values, p):
+    """最近秩法计算百分位数"""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+class MetricSeries:
+    """
+    一组固定大小的环形缓冲区 - 每个指标只保留最近的若干样本
+    """
+
+    def __init__(self, size):
+        self.count = 0
+        self.buffers = {name: deque(maxlen=size) for name in FIELDS}
+
+    def add(self, sample):
+        self.count += 1
+        for name, value in sample.items():
+            if value is not None:
+                self.buffers[name].append(value)
+
+    def aggregate(self):
+        result = {'count': self.count}
+        for name, buffer in self.buffers.items():
+            values = sorted(buffer)
+            if not values:
+                continue
+            scale = 1 if name == 'bytes' else 1000  # 耗时以毫秒输出
+            result[name] = {
+                p: round(percentile(values, int(p[1:])) * scale, 3)
+                for p in ('p50', 'p95', 'p99')
+            }
+        return result
+
+class FlowMetrics:
+    """
+    性能统计插件 - 需添加在ResponseModifierAddon之后，以便读取其写入的计时
+    """
+
+    def __init__(self, size=512):
+        self.size = size
+        self.started_at = time.time()
+        self.total = MetricSeries(size)
+        self.by_host = {}
+        self.by_rule = {}
+        self.lock = threading.Lock()  # 统计面板在GUI线程读取
+        self.extra_sources = {}  # 名称 -> 返回可JSON序列化数据的函数
+        # 已统计过建立耗时的客户端连接，每个连接只在其第一个请求上统计一次
+        self.client_conns = set()
+        self.client_conn_order = deque()
+
+    def request(self, flow: http.HTTPFlow) -> None:
+        """拦截统计接口请求，直接返回JSON"""
+        if flow.request.pretty_host == STATS_HOST:
+            flow.response = http.Response.make(
+                200,
+                json.dumps(self.snapshot(), ensure_ascii=False, indent=2),
+                {"Content-Type": "application/json; charset=utf-8", "Cache-Control": "no-store"},
+            )
+
+    def response(self, flow: http.HTTPFlow) -> None:
+        if flow.request.pretty_host == STATS_HOST:
+            return
+        self.record(flow)
+
+    def record(self, flow: http.HTTPFlow):
+        """根据flow的时间戳计算各项指标并记录"""
+        request, response = flow.request, flow.response
+        server_conn = flow.server_conn
+        sample = dict.fromkeys(FIELDS)
+
+        # 本次请求新建上游连接时的TCP + TLS建立耗时
+        if server_conn and server_conn.timestamp_start and request.timestamp_start:
+            setup_end = server_conn.timestamp_tls_setup or server_conn.timestamp_tcp_setup
+            if setup_end and server_conn.timestamp_start >= request.timestamp_start:
+                sample['connect'] = setup_end - server_conn.timestamp_start
+        sample['client_connect'] = self.get_client_connect(flow)
+        if response.timestamp_start and request.timestamp_end:
+            sample['ttfb'] = max(0.0, response.timestamp_start - request.timestamp_end)
+        if response.timestamp_end and request.timestamp_start:
+            sample['total'] = response.timestamp_end - request.timestamp_start
+        sample['hook'] = flow.metadata.get(HOOK_TIME_KEY)
+        sample['fetch'] = flow.metadata.get(FETCH_TIME_KEY)
+        if response.raw_content is not None:
+            sample['bytes'] = len(response.raw_content)
+        elif response.headers.get("Content-Length", "").isdigit():
+            sample['bytes'] = int(response.headers["Content-Length"])
+
+        rule = flow.metadata.get(RULE_KEY)
+        with self.lock:
+            self.total.add(sample)
+            host = flow.request.pretty_host
+            if host not in self.by_host:
+                self.by_host[host] = MetricSeries(self.size)
+            self.by_host[host].add(sample)
+            if rule is not None:
+                if rule not in self.by_rule:
+                    self.by_rule[rule] = MetricSeries(self.size)
+                self.by_rule[rule].add(sample)
+
+    def get_client_connect(self, flow: http.HTTPFlow):
+        """
+        客户端连接从接受到TLS握手完成的耗时(HTTPS请求包含CONNECT往返)
+        同一连接上只在第一个完成的请求上返回，其余返回None
+        """
+        client_conn = flow.client_conn
+        if not client_conn or not client_conn.timestamp_start or not client_conn.timestamp_tls_setup:
+            return None
+        with self.lock:
+            if client_conn.id in self.client_conns:
+                return None
+            self.client_conns.add(client_conn.id)
+            self.client_conn_order.append(client_conn.id)
+            if len(self.client_conn_order) > CLIENT_CONN_HISTORY:
+                self.client_conns.discard(self.client_conn_order.popleft())
+        return client_conn.timestamp_tls_setup - client_conn.timestamp_start
+
+    def snapshot(self):
+        """生成当前统计数据(可JSON序列化)"""
+        with self.lock:
+            data = {
+                'uptime': round(time.time() - self.started_at, 1),
+                'total': self.total.aggregate(),
+                'hosts': {host: series.aggregate() for host, series in self.by_host.items()},
+                'rules': {rule: series.aggregate() for rule, series in self.by_rule.items()},
+            }
+        for name, source in self.extra_sources.items():
+            data[name] = source()
+        return data
@@ -2,58 +2,109 @@
 mitmproxy代理服务模块
 """
 
-import asyncio, socket, os
+import asyncio, concurrent.futures
+from mitmproxy import ctx
 from mitmproxy.options import Options
-from mitmproxy.tools.dump import DumpMaster
 
 from .addons import ResponseModifierAddon
+from .cert_cache import LeafCertCache
+from .connections import DEFAULT_MAX_HANDSHAKES_PER_HOST, ConnectionLimiter
+from .log_service import configure_logging, get_logger
+from .master import DEFAULT_PROXY_OPTIONS, ProxyMaster
+from .metrics import FlowMetrics
+from .settings_store import get_settings_store
 
 # 全局插件实例，用于外部控制
 global_addon_instance = None
+# 全局性能统计实例，供统计面板读取
+global_metrics_instance = None
+# 全局代理主控实例
+global_master_instance = None
+
+# 代理就绪通知，结果为实际监听的端口(线程安全，供GUI线程等待)
+proxy_ready = concurrent.futures.Future()
+
+logger = get_logger("service")
+
+class ReadinessAddon:
+    """
+    就绪通知插件 - 端口绑定成功后通过Future报告实际监听端口
+    """
+
+    def __init__(self, future: concurrent.futures.Future):
+        self.future = future
+
+    def running(self):
+        # running事件在所有监听端口绑定完成后触发
+        if self.future.done():
+            return
+        addrs = ctx.master.addons.get("proxyserver").listen_addrs()
+        if addrs:
+            self.future.set_result(addrs[0][1])
+        else:
+            self.future.set_exception(RuntimeError("代理未能监听任何端口"))
+
+def load_proxy_settings():
+    """读取与代理启动相关的设置(不含URL规则)"""
+    return get_settings_store().get_settings()
 
 async def start_proxy_async():
     """
     异步启动mitmproxy代理服务
     """
-    global global_addon_instance
-
-    def get_free_port():
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-            s.bind(('0.0.0.0', 0))
-            return s.getsockname()[1]
+    global global_addon_instance, global_metrics_instance, global_master_instance
 
-    port = get_free_port()
+    # 端口0表示由系统在绑定时分配空闲端口，避免先探测再绑定的竞争
     opts = Options(
         listen_host='127.0.0.1',
-        listen_port=port,
+        listen_port=0,
     )
+    settings = load_proxy_settings()
+    configure_logging(settings.get('log_level', 'info'))
+    # 连接调优选项(HTTP/2、keep-alive等)，可在设置的proxy_options中覆盖
+    proxy_options = dict(DEFAULT_PROXY_OPTIONS)
+    proxy_options.update(settings.get('proxy_options', {}))
 
-    def get_settings_path():
-        """获取设置文件路径"""
-        appdata_path = os.getenv('APPDATA')
-        if not appdata_path:
-            # 如果无法获取APPDATA，则使用当前目录
-            appdata_path = os.path.dirname(os.path.abspath(__file__))
-        settings_dir = os.path.join(appdata_path, "绿杉树")
-        os.makedirs(settings_dir, exist_ok=True)
-        return os.path.join(settings_dir, "port.txt")
+    # 创建精简的代理主控实例
+    m = ProxyMaster(opts, flow_output=bool(settings.get('flow_output', False)))
+    global_master_instance = m
+    try:
+        m.options.update(**proxy_options)
+    except Exception as e:
+        logger.error("代理选项设置失败，使用默认选项: %s", e)
+    # URL替换在request钩子中直接应答，必须收到请求后才连接上游(默认的eager会在CONNECT时就建立上游连接)，
+    # 因此不允许被proxy_options覆盖
+    m.options.update(connection_strategy='lazy')
     
-    with open(get_settings_path(), 'w', encoding='utf-8') as f:
-        f.write(str(port))
+    # 叶子证书磁盘缓存，再次启动时各主机的证书直接从文件读取
+    cert_cache = LeafCertCache()
+    m.addons.add(cert_cache)
 
-    # 创建DumpMaster实例
-    m = DumpMaster(opts)
-    
     # 创建并添加响应修改插件
     global_addon_instance = ResponseModifierAddon()
     m.addons.add(global_addon_instance)
 
+    # 限制每个主机同时进行的握手数并统计连接复用
+    limiter = ConnectionLimiter(settings.get('max_handshakes_per_host', DEFAULT_MAX_HANDSHAKES_PER_HOST))
+    m.addons.add(limiter)
+    
+    # 性能统计插件需在响应修改插件之后，以读取其记录的处理耗时
+    global_metrics_instance = FlowMetrics()
+    global_metrics_instance.extra_sources['hooks'] = lambda: global_addon_instance.settings.hooks.stats()
+    global_metrics_instance.extra_sources['connections'] = limiter.snapshot
+    global_metrics_instance.extra_sources['certs'] = cert_cache.stats
+    m.addons.add(global_metrics_instance)
+    m.addons.add(ReadinessAddon(proxy_ready))
+
     try:
-        print(f"代理服务已启动，监听端口: {opts.listen_port}")
         await m.run()
     except Exception as e:
-        print(f"代理运行出错: {e}")
+        logger.error("代理运行出错: %s", e)
+        if not proxy_ready.done():
+            proxy_ready.set_exception(e)
     finally:
+        if not proxy_ready.done():
+            proxy_ready.set_exception(RuntimeError("代理服务已退出"))
         m.shutdown()
 
 def run_in_thread():
@@ -62,8 +113,30 @@ def run_in_thread():
     """
     asyncio.run(start_proxy_async())
 
+def wait_for_proxy_ready(timeout: float = 15.0) -> int:
+    """
+    等待代理开始监听并返回实际端口
+    超时抛出TimeoutError，代理启动失败时抛出对应异常
+    """
+    port = proxy_ready.result(timeout=timeout)
+    print(f"代理服务已启动，监听端口: {port}")
+    return port
+
 def get_addon_instance():
     """
     获取全局插件实例
     """
-    return global_addon_instance
\ No newline at end of file
+    return global_addon_instance
+
+def get_metrics_instance():
+    """
+    获取全局性能统计实例
+    """
+    return global_metrics_instance
+
+def set_flow_output(enabled: bool):
+    """
+    运行时开关每个请求的控制台输出
+    """
+    if global_master_instance is not None:
+        global_master_instance.set_flow_output(enabled)
\ No newline at end of file
@@ -0,0 +1,15 @@
+"""
+路径工具模块 - 应用数据目录
+"""
+
+import os
+
+def get_app_data_dir(*parts):
+    """获取应用数据目录(%APPDATA%\\绿杉树)，可附加子目录"""
+    appdata_path = os.getenv('APPDATA')
+    if not appdata_path:
+        # 如果无法获取APPDATA，则使用当前目录
+        appdata_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    data_dir = os.path.join(appdata_path, "绿杉树", *parts)
+    os.makedirs(data_dir, exist_ok=True)
+    return data_dir
@@ -0,0 +1,174 @@
+"""
+代理控制模块 - 界面使用的统一接口，代理可运行在独立进程(默认)或本进程的线程中
+独立进程模式下界面进程不导入mitmproxy，代理的CPU开销和卡住的钩子都不会影响界面
+"""
+
+import itertools, multiprocessing, sys, threading
+
+from .settings_store import get_settings_store
+
+# 独立进程模式下等待单次控制命令回复的默认时间(秒)
+CALL_TIMEOUT = 5.0
+
+# 当前的代理进程客户端，线程模式下为None
+global_process = None
+
+def use_proxy_process():
+    """读取proxy_process设置，默认在独立进程中运行代理"""
+    return bool(get_settings_store().get('proxy_process', True))
+
+def run_proxy_process(conn):
+    """
+    代理子进程入口 - 代理在子线程中运行，主线程处理界面进程发来的控制命令
+    命令格式为 (请求ID, 命令, 参数元组)，回复为 (请求ID, 'ok'或'error', 结果)
+    """
+    import asyncio
+    if sys.platform == 'win32':
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+    from . import mitmproxy_service as service
+
+    threading.Thread(target=service.run_in_thread, name="Mitmproxy-Worker", daemon=True).start()
+
+    def set_enabled(enabled):
+        service.get_addon_instance().set_enabled(enabled)
+
+    def reload_settings():
+        service.get_addon_instance().reload_settings()
+
+    def snapshot():
+        metrics = service.get_metrics_instance()
+        return metrics.snapshot() if metrics else None
+
+    commands = {
+        'wait_ready': service.wait_for_proxy_ready,
+        'set_enabled': set_enabled,
+        'reload_settings': reload_settings,
+        'snapshot': snapshot,
+        'set_flow_output': service.set_flow_output,
+    }
+    while True:
+        try:
+            request_id, command, args = conn.recv()
+        except (EOFError, OSError):
+            break  # 界面进程已退出
+        if command == 'stop':
+            break
+        try:
+            conn.send((request_id, 'ok', commands[command](*args)))
+        except Exception as e:
+            conn.send((request_id, 'error', f"{type(e).__name__}: {e}"))
+    conn.close()
+
+class ProxyProcess:
+    """
+    代理进程客户端 - 启动代理子进程并通过管道发送控制命令(线程安全)
+    """
+
+    def __init__(self):
+        context = multiprocessing.get_context('spawn')
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=run_proxy_process, args=(child_conn,),
+                                       name="Mitmproxy-Process", daemon=True)
+        self.lock = threading.Lock()
+        self.request_ids = itertools.count()
+
+    def start(self):
+        self.process.start()
+
+    def call(self, command, *args, timeout=CALL_TIMEOUT):
+        """
+        发送命令并等待回复
+        超时抛出TimeoutError，子进程已退出抛出ConnectionError，命令出错抛出RuntimeError
+        """
+        with self.lock:
+            request_id = next(self.request_ids)
+            try:
+                self.conn.send((request_id, command, args))
+                while True:
+                    if not self.conn.poll(timeout):
+                        raise TimeoutError(f"代理进程未响应命令: {command}")
+                    reply_id, status, result = self.conn.recv()
+                    if reply_id == request_id:
+                        break  # 丢弃之前超时命令的迟到回复
+            except (EOFError, OSError) as e:
+                raise ConnectionError("代理进程已退出") from e
+        if status == 'error':
+            raise RuntimeError(result)
+        return result
+
+    def stop(self):
+        """通知子进程退出"""
+        try:
+            with self.lock:
+                self.conn.send((None, 'stop', ()))
+        except OSError:
+            pass
+        self.process.join(2)
+
+class RemoteAddon:
+    """与ResponseModifierAddon相同的控制接口，命令转发到代理进程"""
+
+    def __init__(self, process: ProxyProcess):
+        self.process = process
+
+    def set_enabled(self, enabled: bool):
+        self.process.call('set_enabled', enabled)
+
+    def reload_settings(self):
+        self.process.call('reload_settings')
+
+class RemoteMetrics:
+    """与FlowMetrics相同的读取接口，统计数据从代理进程获取"""
+
+    def __init__(self, process: ProxyProcess):
+        self.process = process
+
+    def snapshot(self):
+        return self.process.call('snapshot')
+
+def start_proxy(out_of_process=None):
+    """
+    启动代理服务，out_of_process为None时按设置决定
+    线程模式下在线程内导入mitmproxy，与界面模块的导入并行
+    """
+    global global_process
+    if out_of_process is None:
+        out_of_process = use_proxy_process()
+    if out_of_process:
+        global_process = ProxyProcess()
+        global_process.start()
+        return
+
+    def run_proxy():
+        from .mitmproxy_service import run_in_thread
+        run_in_thread()
+    threading.Thread(target=run_proxy, name="Mitmproxy-Worker", daemon=True).start()
+
+def wait_for_proxy_ready(timeout: float = 15.0) -> int:
+    """等待代理开始监听并返回实际端口"""
+    if global_process is not None:
+        return global_process.call('wait_ready', timeout, timeout=timeout + 1)
+    from .mitmproxy_service import wait_for_proxy_ready
+    return wait_for_proxy_ready(timeout)
+
+def get_addon_instance():
+    """获取插件(或其远程代理)，代理未启动时返回None"""
+    if global_process is not None:
+        return RemoteAddon(global_process)
+    from .mitmproxy_service import get_addon_instance
+    return get_addon_instance()
+
+def get_metrics_instance():
+    """获取性能统计(或其远程代理)，代理未启动时返回None"""
+    if global_process is not None:
+        return RemoteMetrics(global_process)
+    from .mitmproxy_service import get_metrics_instance
+    return get_metrics_instance()
+
+def set_flow_output(enabled: bool):
+    """运行时开关每个请求的控制台输出"""
+    if global_process is not None:
+        global_process.call('set_flow_output', enabled)
+        return
+    from .mitmproxy_service import set_flow_output
+    set_flow_output(enabled)
@@ -0,0 +1,126 @@
+"""
+设置服务模块 - 监视设置存储并热更新设置快照
+"""
+
+import importlib, threading
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Callable
+
+from mitmproxy import http, ctx
+
+from .hooks import DEFAULT_BUDGET_MS, HookPipeline, compile_hooks
+from .log_service import get_logger
+from .settings_store import SettingsStore
+from .theme_pack import ThemePackSet
+from .transforms import TransformTable
+from .url_rules import UrlRuleIndex
+
+logger = get_logger("settings")
+
+@dataclass(frozen=True)
+class SettingsSnapshot:
+    """
+    不可变的设置快照 - 每次文件变化时整体构建，插件通过替换引用原子地切换
+    """
+    username: str = ''
+    password: str = ''
+    url_replacements: MappingProxyType = field(default_factory=lambda: MappingProxyType({}))
+    url_rules: UrlRuleIndex = field(default_factory=UrlRuleIndex)
+    hooks: HookPipeline = field(default_factory=HookPipeline)
+    url_transforms: TransformTable = field(default_factory=TransformTable)
+    theme_packs: ThemePackSet = field(default_factory=ThemePackSet)
+    intercept_all_hosts: bool = False  # 为True时不按主机白名单跳过拦截
+
+    @property
+    def has_credentials(self):
+        return bool(self.username and self.password)
+
+def build_snapshot(settings: dict) -> SettingsSnapshot:
+    """由完整设置(SettingsStore.load的结果)构建快照，编译规则索引、响应变换和自定义钩子，打开主题包"""
+    url_replacements = settings.get('url_replacements', {})
+
+    # 自定义代码只在设置变化时编译一次
+    hooks = []
+    custom_response_code = settings.get('custom_response_code', '')
+    if custom_response_code:
+        exec_globals = {'http': http, 'ctx': ctx}
+        # requests导入较慢，只在自定义代码用到时才导入
+        if 'requests' in custom_response_code:
+            exec_globals['requests'] = importlib.import_module('requests')
+        hooks += compile_hooks(custom_response_code, 'response', 'custom_response', exec_globals)
+    custom_request_code = settings.get('custom_request_code', '')
+    if custom_request_code:
+        hooks += compile_hooks(custom_request_code, 'request', 'custom_request',
+                               {'http': http, 'ctx': ctx})
+
+    return SettingsSnapshot(
+        username=settings.get('username', ''),
+        password=settings.get('password', ''),
+        url_replacements=MappingProxyType(dict(url_replacements)),
+        url_rules=UrlRuleIndex(url_replacements),
+        hooks=HookPipeline(hooks, settings.get('hook_budget_ms', DEFAULT_BUDGET_MS)),
+        url_transforms=TransformTable(settings.get('url_transforms', {})),
+        theme_packs=ThemePackSet(settings.get('theme_packs', [])),
+        intercept_all_hosts=bool(settings.get('intercept_all_hosts', False)),
+    )
+
+class SettingsWatcher:
+    """
+    设置监视器 - 后台线程轮询设置存储的修改计数(一次单行查询)，变化时加载一次并回调新快照
+    """
+
+    def __init__(self, store: SettingsStore, on_change: Callable[[SettingsSnapshot], None], interval: float = 0.5):
+        self.store = store
+        self.on_change = on_change
+        self.interval = interval
+        self.version = None  # 上次成功加载时的修改计数
+        self.failed_version = None  # 上次加载失败时的修改计数，避免重复报错
+        self.stop_event = threading.Event()
+        self.wake_event = threading.Event()  # 要求立即检查，不必等待下一次轮询
+        self.thread = None
+
+    def check(self):
+        """
+        检查设置是否变化，变化时重新加载并回调
+        加载或编译失败(例如规则有误)时保留旧快照，直到设置再次变化
+        """
+        try:
+            version = self.store.version()
+        except Exception as e:
+            logger.error("读取设置版本失败: %s", e)
+            return False
+        if version in (self.version, self.failed_version):
+            return False
+        try:
+            snapshot = build_snapshot(self.store.load())
+        except Exception as e:
+            logger.error("加载设置失败: %s", e)
+            self.failed_version = version
+            return False
+        self.version = version
+        self.on_change(snapshot)
+        return True
+
+    def start(self):
+        """启动后台监视线程"""
+        self.thread = threading.Thread(target=self.run, name="Settings-Watcher", daemon=True)
+        self.thread.start()
+
+    def run(self):
+        # 检查只在本线程中进行，快照不会被重复构建或乱序应用
+        while True:
+            self.wake_event.wait(self.interval)
+            self.wake_event.clear()
+            if self.stop_event.is_set():
+                return
+            self.check()
+
+    def wake(self):
+        """唤醒监视线程立即检查设置(可在任意线程调用)"""
+        self.wake_event.set()
+
+    def stop(self):
+        """停止监视线程"""
+        self.stop_event.set()
+        self.wake_event.set()
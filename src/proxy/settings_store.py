@@ -0,0 +1,217 @@
+"""
+设置存储模块 - 基于SQLite(WAL模式)的设置和URL规则存储
+普通设置按键逐行保存，URL规则每条一行；任何修改都会让版本计数加一，代理只需轮询该计数
+URL规则和CONTENT_KEYS中的设置修改时另有内容计数加一，界面据此判断替换的资源是否可能变化
+"""
+
+import json, os, sqlite3, threading
+from contextlib import contextmanager
+
+from .paths import get_app_data_dir
+
+SCHEMA_VERSION = 2
+
+# 影响替换资源内容的普通设置项(URL规则总是计入)
+CONTENT_KEYS = ('url_transforms', 'theme_packs')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS settings (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS url_rules (
+    pattern TEXT PRIMARY KEY,
+    target TEXT NOT NULL,
+    position INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS url_rules_position ON url_rules(position);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('version', 0);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('content_version', 0);
+"""
+
+# 每张表的增删改都让版本计数加一
+TRIGGER = """
+CREATE TRIGGER IF NOT EXISTS {table}_{event}_version AFTER {event} ON {table}
+BEGIN
+    UPDATE meta SET value = value + 1 WHERE key = 'version';
+END;
+"""
+
+# URL规则或CONTENT_KEYS中的设置增删改时内容计数加一
+CONTENT_TRIGGER = """
+CREATE TRIGGER IF NOT EXISTS {table}_{event}_content AFTER {event} ON {table}
+{condition}
+BEGIN
+    UPDATE meta SET value = value + 1 WHERE key = 'content_version';
+END;
+"""
+
+class SettingsStore:
+    """
+    设置存储 - 每个线程使用独立的连接，可同时被界面进程和代理进程打开
+    """
+
+    def __init__(self, path=None, json_path=None):
+        self.path = path or os.path.join(get_app_data_dir(), "settings.db")
+        # 旧版本使用的设置文件，首次打开时导入
+        self.json_path = json_path or os.path.join(os.path.dirname(self.path), "settings.json")
+        self.local = threading.local()
+        self.initialize()
+
+    def connect(self) -> sqlite3.Connection:
+        """获取当前线程的连接"""
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            # isolation_level=None: 由代码显式控制事务
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+        return conn
+
+    def initialize(self):
+        """
+        创建或升级表结构，并在首次打开时导入settings.json(两个进程同时启动时只导入一次)
+        建表语句都可重复执行，升级时只补充缺少的部分
+        """
+        conn = self.connect()
+        if conn.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            user_version = conn.execute("PRAGMA user_version").fetchone()[0]
+            migrated = False
+            if user_version < SCHEMA_VERSION:
+                for statement in SCHEMA.split(';'):
+                    if statement.strip():
+                        conn.execute(statement)
+                keys = ', '.join(f"'{key}'" for key in CONTENT_KEYS)
+                for event, row in (('INSERT', 'NEW'), ('UPDATE', 'NEW'), ('DELETE', 'OLD')):
+                    for table in ('settings', 'url_rules'):
+                        conn.execute(TRIGGER.format(table=table, event=event))
+                    conn.execute(CONTENT_TRIGGER.format(table='url_rules', event=event, condition=''))
+                    conn.execute(CONTENT_TRIGGER.format(table='settings', event=event,
+                                                        condition=f"WHEN {row}.key IN ({keys})"))
+                if user_version == 0:
+                    migrated = self.import_json(conn)
+                conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        if migrated:
+            # 保留旧文件作为备份，之后不再读取
+            os.replace(self.json_path, self.json_path + ".bak")
+
+    def import_json(self, conn) -> bool:
+        """将旧的settings.json导入数据库(在事务中调用)，返回是否导入"""
+        try:
+            with open(self.json_path, 'r', encoding='utf-8') as f:
+                settings = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if not isinstance(settings, dict):
+            return False
+        rules = settings.pop('url_replacements', None) or {}
+        conn.executemany("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)",
+                         [(key, json.dumps(value, ensure_ascii=False)) for key, value in settings.items()])
+        conn.executemany("INSERT OR REPLACE INTO url_rules (pattern, target, position) VALUES (?, ?, ?)",
+                         [(pattern, json.dumps(target, ensure_ascii=False), i)
+                          for i, (pattern, target) in enumerate(rules.items())])
+        return True
+
+    def version(self) -> int:
+        """当前的修改计数，任何设置或规则变化后都会增大"""
+        return self.connect().execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+
+    def content_version(self) -> int:
+        """内容修改计数，只在URL规则或CONTENT_KEYS中的设置变化后增大"""
+        return self.connect().execute("SELECT value FROM meta WHERE key = 'content_version'").fetchone()[0]
+
+    def get(self, key, default=None):
+        """读取单项设置"""
+        row = self.connect().execute("SELECT value FROM settings WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def get_settings(self) -> dict:
+        """读取全部普通设置(不含URL规则)"""
+        rows = self.connect().execute("SELECT key, value FROM settings").fetchall()
+        return {key: json.loads(value) for key, value in rows}
+
+    def get_rules(self) -> dict:
+        """按声明顺序读取全部URL规则: 规则 -> 目标"""
+        rows = self.connect().execute("SELECT pattern, target FROM url_rules ORDER BY position").fetchall()
+        return {pattern: json.loads(target) for pattern, target in rows}
+
+    def load(self) -> dict:
+        """
+        读取与旧settings.json结构相同的完整设置
+        两次查询在同一个读事务中，不会读到一半的修改
+        """
+        conn = self.connect()
+        conn.execute("BEGIN")
+        try:
+            settings = self.get_settings()
+            settings['url_replacements'] = self.get_rules()
+            return settings
+        finally:
+            conn.execute("COMMIT")
+
+    @contextmanager
+    def transaction(self):
+        """写事务，退出时提交，出错时回滚"""
+        conn = self.connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def save(self, values: dict = None, rules: dict = None):
+        """在同一个事务中保存设置项和(可选的)全部URL规则，代理不会读到只保存了一半的设置"""
+        with self.transaction() as conn:
+            if values:
+                self.write_values(conn, values)
+            if rules is not None:
+                self.write_rules(conn, rules)
+
+    def write_values(self, conn, values: dict):
+        """写入设置项，只写入值有变化的项(在事务中调用)"""
+        current = self.get_settings()
+        changed = [(key, json.dumps(value, ensure_ascii=False)) for key, value in values.items()
+                   if key not in current or current[key] != value]
+        conn.executemany("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)", changed)
+
+    def write_rules(self, conn, rules: dict):
+        """
+        用新的规则集合替换全部规则(在事务中调用)，只对新增、删除、目标或顺序变化的行写入
+        例如在几千条规则中修改一条只会更新一行
+        """
+        current = {pattern: (target, position) for pattern, target, position in
+                   conn.execute("SELECT pattern, target, position FROM url_rules")}
+        removed = [(pattern,) for pattern in current if pattern not in rules]
+        changed = []
+        for position, (pattern, target) in enumerate(rules.items()):
+            encoded = json.dumps(target, ensure_ascii=False)
+            if current.get(pattern) != (encoded, position):
+                changed.append((pattern, encoded, position))
+        conn.executemany("DELETE FROM url_rules WHERE pattern = ?", removed)
+        conn.executemany("INSERT OR REPLACE INTO url_rules (pattern, target, position) VALUES (?, ?, ?)", changed)
+
+# 每个进程共用一个存储实例
+_store = None
+_store_lock = threading.Lock()
+
+def get_settings_store() -> SettingsStore:
+    """获取本进程的设置存储"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = SettingsStore()
+        return _store
@@ -0,0 +1,228 @@
+"""
+主题包模块 - 将大量替换资源打包为单个文件，代理通过mmap按需读取，完全离线
+
+文件格式:
+    头部    8字节魔数 + 4字节格式版本 + 4字节索引长度(小端)
+    索引    UTF-8 JSON: {"assets": {原始URL: [偏移, 长度, Content-Type, ETag]}}
+    数据    各资源内容依次排列，偏移相对于数据区起始位置
+
+打包:
+    python -m src.proxy.theme_pack build <目录> <输出文件>
+    python -m src.proxy.theme_pack build <目录> <输出文件> --base-url https://style.example.com/
+未指定--base-url时目录第一层为主机名，例如 <目录>/style.example.com/img/bg.png
+对应 https://style.example.com/img/bg.png
+
+Windows上正在被代理映射的主题包文件无法被替换: 请打包为新文件名后修改theme_packs，
+或先在设置中移除该主题包(代理随即关闭映射)再重新打包
+"""
+
+import argparse, hashlib, json, mimetypes, mmap, os, struct, sys
+from urllib.parse import quote, urlsplit
+
+from .log_service import get_logger
+
+MAGIC = b"GWTHEME\x00"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<8sII")
+
+logger = get_logger("theme_pack")
+
+class ThemePackError(ValueError):
+    """主题包文件格式错误"""
+
+class ThemeAsset:
+    """
+    主题包中的一个资源 - 只保存位置信息，内容在返回响应时才从映射中切出
+    """
+
+    __slots__ = ('pack', 'start', 'end', 'content_type', 'etag')
+
+    def __init__(self, pack, start, length, content_type, etag):
+        self.pack = pack
+        self.start = start
+        self.end = start + length
+        self.content_type = content_type
+        self.etag = etag
+
+    @property
+    def size(self):
+        return self.end - self.start
+
+    @property
+    def content(self) -> bytes:
+        """资源内容(从映射的页缓存中复制一次，不经过文件读取)"""
+        return self.pack.mm[self.start:self.end]
+
+class ThemePack:
+    """
+    打开的主题包 - 整个文件只读映射到内存，资源在首次访问时才由系统分页读入
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.name = os.path.splitext(os.path.basename(path))[0]
+        with open(path, 'rb') as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self.assets = self.read_index()
+        except BaseException:
+            self.mm.close()
+            raise
+
+    def read_index(self):
+        """校验头部并解析索引，返回 原始URL -> ThemeAsset"""
+        if len(self.mm) < HEADER.size:
+            raise ThemePackError(f"主题包文件过短: {self.path}")
+        magic, version, index_length = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC:
+            raise ThemePackError(f"不是主题包文件: {self.path}")
+        if version != FORMAT_VERSION:
+            raise ThemePackError(f"不支持的主题包版本 {version}: {self.path}")
+        data_offset = HEADER.size + index_length
+        if data_offset > len(self.mm):
+            raise ThemePackError(f"主题包索引不完整: {self.path}")
+        try:
+            index = json.loads(self.mm[HEADER.size:data_offset].decode('utf-8'))
+            assets = {}
+            for url, (offset, length, content_type, etag) in index['assets'].items():
+                if offset < 0 or length < 0 or data_offset + offset + length > len(self.mm):
+                    raise ThemePackError(f"主题包资源超出文件范围: {url}")
+                assets[url] = ThemeAsset(self, data_offset + offset, length, content_type, etag)
+        except (ValueError, KeyError, TypeError) as e:
+            raise ThemePackError(f"主题包索引格式错误: {self.path}: {e}") from e
+        return assets
+
+    def __len__(self):
+        return len(self.assets)
+
+    def get(self, url):
+        """按URL查找资源，未命中时忽略查询参数(如?v=123)再查找一次"""
+        asset = self.assets.get(url)
+        if asset is None and '?' in url:
+            asset = self.assets.get(url.split('?', 1)[0])
+        return asset
+
+    def hosts(self):
+        """包内资源涉及的主机名集合"""
+        return {urlsplit(url).hostname for url in self.assets} - {None}
+
+    def close(self):
+        """关闭文件映射(之后不能再读取资源内容)"""
+        self.mm.close()
+
+class ThemePackSet:
+    """
+    设置中theme_packs列出的全部主题包，按声明顺序查找
+    打开失败的主题包记录警告后跳过，不影响其他设置
+    """
+
+    def __init__(self, paths=()):
+        self.packs = []
+        for path in paths:
+            path = os.path.expandvars(os.path.expanduser(path))
+            try:
+                self.packs.append(ThemePack(path))
+            except (OSError, ValueError) as e:
+                logger.warn("加载主题包失败: %s", e)
+                continue
+            logger.info("已加载主题包 %s，共 %d 个资源", path, len(self.packs[-1]))
+
+    def __len__(self):
+        return len(self.packs)
+
+    def get(self, url):
+        """查找URL对应的资源，未命中返回None"""
+        for pack in self.packs:
+            asset = pack.get(url)
+            if asset is not None:
+                return asset
+        return None
+
+    def hosts(self):
+        hosts = set()
+        for pack in self.packs:
+            hosts |= pack.hosts()
+        return hosts
+
+    def close(self):
+        """关闭全部主题包的文件映射，释放文件以便重新打包"""
+        for pack in self.packs:
+            pack.close()
+
+def collect_assets(directory, base_url=None):
+    """遍历目录，返回按URL排序的 [(原始URL, 文件路径)]"""
+    files = []
+    for root, _, names in os.walk(directory):
+        for name in names:
+            path = os.path.join(root, name)
+            relative = os.path.relpath(path, directory).replace(os.sep, '/')
+            if base_url:
+                url = base_url.rstrip('/') + '/' + quote(relative)
+            else:
+                host, _, rest = relative.partition('/')
+                if not rest:
+                    continue  # 未指定base_url时根目录下的文件没有对应主机
+                url = f"https://{host}/{quote(rest)}"
+            files.append((url, path))
+    files.sort()
+    return files
+
+def build_pack(directory, output, base_url=None):
+    """
+    将目录打包为主题包，返回打包的资源数
+    先写临时文件再替换；目标文件正在被代理使用(Windows上无法替换)时抛出PermissionError
+    """
+    files = collect_assets(directory, base_url)
+    index = {}
+    offset = 0
+    for url, path in files:
+        with open(path, 'rb') as f:
+            digest = hashlib.sha1(f.read()).hexdigest()
+        length = os.path.getsize(path)
+        content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        index[url] = [offset, length, content_type, f'"{digest[:16]}"']
+        offset += length
+    index_bytes = json.dumps({'assets': index}, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+    tmp_path = output + ".tmp"
+    with open(tmp_path, 'wb') as out:
+        out.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(index_bytes)))
+        out.write(index_bytes)
+        for url, path in files:
+            with open(path, 'rb') as f:
+                out.write(f.read())
+    try:
+        os.replace(tmp_path, output)
+    except PermissionError:
+        os.remove(tmp_path)
+        raise
+    return len(files)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m src.proxy.theme_pack", description="绿杉树主题包工具")
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help="将目录打包为主题包")
+    build.add_argument('directory', help="资源目录")
+    build.add_argument('output', help="输出的主题包文件")
+    build.add_argument('--base-url', help="目录对应的URL前缀，未指定时目录第一层为主机名")
+    show = commands.add_parser('list', help="列出主题包中的资源")
+    show.add_argument('pack', help="主题包文件")
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        try:
+            count = build_pack(args.directory, args.output, args.base_url)
+        except PermissionError:
+            sys.exit(f"无法替换 {args.output}: 文件正在被代理使用。"
+                     "请打包为新文件名后修改theme_packs设置，或先在设置中移除该主题包再重新打包")
+        print(f"已打包 {count} 个资源: {args.output} ({os.path.getsize(args.output)} 字节)")
+    else:
+        try:
+            pack = ThemePack(args.pack)
+        except (OSError, ValueError) as e:
+            sys.exit(f"打开主题包失败: {e}")
+        for url, asset in pack.assets.items():
+            print(f"{asset.size:>10}  {asset.content_type:<28} {url}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+响应变换模块 - 设置中url_transforms的声明式规则，加载时编译一次
+"""
+
+import mimetypes, os, re
+from mitmproxy import http
+
+from .url_rules import UrlRuleIndex
+
+# 支持的变换操作
+OPERATIONS = ('set_headers', 'remove_headers', 'inject_css', 'inject_js', 'replace', 'file')
+
+class TransformError(ValueError):
+    """变换规则格式错误"""
+
+class ResponseTransform:
+    """
+    一条编译后的变换规则
+    规则值示例:
+        {
+            "set_headers": {"Cache-Control": "max-age=600"},
+            "remove_headers": ["Content-Security-Policy"],
+            "inject_css": "body { font-size: 16px; }",
+            "inject_js": "console.log('hi');",
+            "replace": [["正则", "替换文本"]],
+            "file": "D:/theme/main.css"
+        }
+    file表示直接返回本地文件，不再请求上游；其余操作作用于上游(或替换后)的响应
+    """
+
+    __slots__ = ('pattern', 'set_headers', 'remove_headers', 'inject_html', 'replacements', 'file_path')
+
+    def __init__(self, pattern, spec):
+        self.pattern = pattern
+        if not isinstance(spec, dict):
+            raise TransformError(f"规则 {pattern} 的值必须是对象")
+        unknown = set(spec) - set(OPERATIONS)
+        if unknown:
+            raise TransformError(f"规则 {pattern} 包含未知操作: {', '.join(sorted(unknown))}")
+
+        set_headers = spec.get('set_headers', {})
+        if not isinstance(set_headers, dict):
+            raise TransformError(f"规则 {pattern} 的set_headers必须是对象")
+        self.set_headers = tuple((str(k), str(v)) for k, v in set_headers.items())
+
+        remove_headers = spec.get('remove_headers', [])
+        if isinstance(remove_headers, str):
+            remove_headers = [remove_headers]
+        self.remove_headers = tuple(str(name) for name in remove_headers)
+
+        # CSS和JS合并为一段HTML，插入到</head>之前
+        snippet = ''
+        if spec.get('inject_css'):
+            snippet += f"<style>{spec['inject_css']}</style>"
+        if spec.get('inject_js'):
+            snippet += f"<script>{spec['inject_js']}</script>"
+        self.inject_html = snippet or None
+
+        replacements = []
+        for item in spec.get('replace', []):
+            if not isinstance(item, (list, tuple)) or len(item) != 2:
+                raise TransformError(f"规则 {pattern} 的replace每项必须是 [正则, 替换文本]")
+            try:
+                replacements.append((re.compile(item[0]), item[1]))
+            except re.error as e:
+                raise TransformError(f"规则 {pattern} 的replace正则错误: {e}") from e
+        self.replacements = tuple(replacements)
+
+        file_path = spec.get('file')
+        self.file_path = os.path.expandvars(os.path.expanduser(file_path)) if file_path else None
+
+    @property
+    def needs_body(self):
+        """是否需要读取完整响应体"""
+        return self.inject_html is not None or bool(self.replacements)
+
+    def apply_headers(self, response: http.Response):
+        """设置/删除响应头(可重复调用)"""
+        for name in self.remove_headers:
+            response.headers.pop(name, None)
+        for name, value in self.set_headers:
+            response.headers[name] = value
+
+    def apply_body(self, response: http.Response):
+        """对文本响应体执行正则替换和HTML注入，只解码和编码一次"""
+        if not self.needs_body or response.raw_content is None:
+            return
+        content_type = response.headers.get("Content-Type", "")
+        is_html = "html" in content_type
+        if not is_html and not (self.replacements and content_type.startswith(("text/", "application/"))):
+            return  # 只注入HTML；图片等二进制内容不做替换
+        text = response.get_text(strict=False)
+        if text is None:
+            return
+        for regex, replacement in self.replacements:
+            text = regex.sub(replacement, text)
+        if self.inject_html is not None and is_html:
+            index = text.find("</head>")
+            if index < 0:
+                index = text.find("</body>")
+            text = text + self.inject_html if index < 0 else text[:index] + self.inject_html + text[index:]
+        response.text = text
+
+    def make_file_response(self) -> http.Response:
+        """读取本地文件构造响应(在工作线程中调用)"""
+        with open(self.file_path, 'rb') as f:
+            content = f.read()
+        content_type = mimetypes.guess_type(self.file_path)[0] or "application/octet-stream"
+        return http.Response.make(200, content, {
+            "Content-Type": content_type,
+            "Access-Control-Allow-Origin": "*",
+            "Cache-Control": "no-cache",
+        })
+
+class TransformTable:
+    """
+    变换规则分发表 - 规则键的写法与url_replacements相同(精确、前缀*、glob:、re:)
+    规则索引中保存的是规则序号，命中后直接取出编译好的变换
+    """
+
+    def __init__(self, rules=None):
+        self.transforms = []
+        index = {}
+        for pattern, spec in (rules or {}).items():
+            index[pattern] = len(self.transforms)
+            self.transforms.append(ResponseTransform(pattern, spec))
+        try:
+            self.index = UrlRuleIndex(index)
+        except re.error as e:
+            raise TransformError(f"变换规则的正则错误: {e}") from e
+
+    def __len__(self):
+        return len(self.transforms)
+
+    def match(self, url):
+        """查找URL命中的变换，未命中返回None"""
+        if not self.transforms:
+            return None
+        match = self.index.match(url)
+        return self.transforms[match.value] if match is not None else None
+
+    def hosts(self):
+        """规则可能命中的主机名集合，无法确定时返回None"""
+        return self.index.hosts()
@@ -0,0 +1,152 @@
+"""
+URL规则索引模块 - 预编译的URL规则匹配
+"""
+
+import fnmatch, re
+from urllib.parse import urlsplit
+
+# 前缀树节点中保存规则的键(不会与单个字符冲突)
+_RULE_KEY = ''
+
+# 目标模板中的转义: 八进制转义、\g<名称>、\1等分组引用、其他单字符转义
+_TEMPLATE_ESCAPE = re.compile(r'\\([0-7]{3}|g<([^>]*)>|[1-9][0-9]?|g|[\s\S]?)')
+
+def check_template(pattern, target):
+    """
+    检查正则规则的目标模板能否展开，引用不存在的分组或转义错误时抛出re.error
+    非正则规则不做检查
+    """
+    if not pattern.startswith('re:'):
+        return
+    regex = re.compile(pattern[3:])
+    for m in _TEMPLATE_ESCAPE.finditer(target):
+        escape, name = m.group(1), m.group(2)
+        if name is not None:
+            if name in regex.groupindex:
+                continue
+            try:
+                index = int(name)
+            except ValueError:
+                raise re.error(f"unknown group name '{name}'") from None
+            if not 0 <= index <= regex.groups:
+                raise re.error(f"invalid group reference {name}")
+        elif escape[:1].isdigit():
+            if len(escape) < 3 and int(escape) > regex.groups:
+                raise re.error(f"invalid group reference {escape}")
+            if len(escape) == 3 and int(escape, 8) > 0o377:
+                raise re.error(f"octal escape value \\{escape} outside of range 0-0o377")
+        elif not escape or escape == 'g' or (escape.isascii() and escape.isalpha() and escape not in 'abfnrtv'):
+            raise re.error(f"bad escape \\{escape}")
+
+class RuleMatch:
+    """
+    一次规则匹配的结果
+    """
+
+    __slots__ = ('pattern', 'value', 'remainder', 're_match')
+
+    def __init__(self, pattern, value, remainder=None, re_match=None):
+        self.pattern = pattern  # 规则原文(settings.json中的键)
+        self.value = value  # 规则值
+        self.remainder = remainder  # 前缀规则匹配后剩余的部分
+        self.re_match = re_match  # 正则规则的匹配对象
+
+    def resolve(self, target):
+        """
+        根据匹配结果展开目标URL
+        前缀规则的目标以*结尾时拼接剩余部分；正则规则支持 \\1 等分组引用
+        """
+        if self.remainder is not None and target.endswith('*'):
+            return target[:-1] + self.remainder
+        if self.re_match is not None:
+            return self.re_match.expand(target)
+        return target
+
+class UrlRuleIndex:
+    """
+    URL规则索引 - 设置加载时构建一次，每个请求按URL查找
+    规则键的写法:
+      - 完整URL: 精确匹配(字典查找)
+      - 以*结尾的URL: 主机 + 路径前缀匹配(前缀树，最长前缀优先)
+      - glob:开头: 通配符匹配
+      - re:开头: 正则匹配(需匹配整个URL)
+    匹配优先级为 精确 > 前缀 > 通配符/正则(按声明顺序)
+    """
+
+    def __init__(self, rules=None):
+        self.exact = {}  # url -> (pattern, value)
+        self.prefix = {}  # scheme://host -> 路径前缀树
+        self.patterns = []  # [(compiled_regex, pattern, value, is_regex)]
+        self.count = 0
+        for pattern, value in (rules or {}).items():
+            self.add(pattern, value)
+
+    def __len__(self):
+        return self.count
+
+    def add(self, pattern, value):
+        """添加一条规则，正则语法错误时抛出re.error"""
+        if pattern.startswith('re:'):
+            self.patterns.append((re.compile(pattern[3:]), pattern, value, True))
+        elif pattern.startswith('glob:'):
+            self.patterns.append((re.compile(fnmatch.translate(pattern[5:])), pattern, value, False))
+        elif pattern.endswith('*') and '*' not in pattern[:-1]:
+            origin, path = self.split_url(pattern[:-1])
+            node = self.prefix.setdefault(origin, {})
+            for char in path:
+                node = node.setdefault(char, {})
+            node[_RULE_KEY] = (pattern, value)
+        elif '*' in pattern:
+            self.patterns.append((re.compile(fnmatch.translate(pattern)), pattern, value, False))
+        else:
+            self.exact[pattern] = (pattern, value)
+        self.count += 1
+
+    @staticmethod
+    def split_url(url):
+        """拆分为 (scheme://host, 路径及查询部分)"""
+        parts = urlsplit(url)
+        origin = f"{parts.scheme}://{parts.netloc}"
+        return origin, url[len(origin):]
+
+    def match(self, url):
+        """查找URL命中的规则，未命中返回None"""
+        hit = self.exact.get(url)
+        if hit is not None:
+            return RuleMatch(hit[0], hit[1])
+
+        if self.prefix:
+            origin, path = self.split_url(url)
+            node = self.prefix.get(origin)
+            if node is not None:
+                best = node.get(_RULE_KEY)
+                best_len = 0
+                for i, char in enumerate(path):
+                    node = node.get(char)
+                    if node is None:
+                        break
+                    if _RULE_KEY in node:
+                        best = node[_RULE_KEY]
+                        best_len = i + 1
+                if best is not None:
+                    return RuleMatch(best[0], best[1], remainder=path[best_len:])
+
+        for regex, pattern, value, is_regex in self.patterns:
+            m = regex.fullmatch(url)
+            if m is not None:
+                return RuleMatch(pattern, value, re_match=m if is_regex else None)
+        return None
+
+    def hosts(self):
+        """
+        返回规则可能命中的主机名集合
+        存在无法确定主机的通配符/正则规则时返回None
+        """
+        if self.patterns:
+            return None
+        hosts = set()
+        for url in list(self.exact) + list(self.prefix):
+            host = urlsplit(url).hostname
+            if host:
+                hosts.add(host)
+        return hosts